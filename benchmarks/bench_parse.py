@@ -0,0 +1,64 @@
+''' Compare per sample parse time of the pandas and fastparse readers on
+synthetic Salmon and Kallisto results.
+
+usage: python benchmarks/bench_parse.py [n_transcripts] [n_samples]
+'''
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from readquant import parse, fastparse
+
+
+def write_salmon(sample_path, names, rng):
+    os.makedirs(sample_path)
+    tpm = rng.exponential(1., len(names)) * (rng.rand(len(names)) < 0.3)
+    with open(sample_path + '/quant.sf', 'w') as fh:
+        fh.write('Name\tLength\tEffectiveLength\tTPM\tNumReads\n')
+        for name, t in zip(names, tpm):
+            fh.write('{}\t1500\t1350.2\t{:g}\t{:g}\n'.format(name, t, t * 10))
+
+    with open(sample_path + '/abundance.tsv', 'w') as fh:
+        fh.write('target_id\tlength\teff_length\test_counts\ttpm\n')
+        for name, t in zip(names, tpm):
+            fh.write('{}\t1500\t1350.2\t{:g}\t{:g}\n'.format(name, t * 10, t))
+
+
+def time_reader(reader, sample_paths, **kwargs):
+    fastparse._last_index = None
+    start = time.time()
+    for sample_path in sample_paths:
+        reader(sample_path, **kwargs)
+
+    return (time.time() - start) / len(sample_paths)
+
+
+def main(n_transcripts=200000, n_samples=20):
+    rng = np.random.RandomState(0)
+    names = ['ENST{:011d}.{}'.format(i, i % 7) for i in range(n_transcripts)]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        sample_paths = [tmp_dir + '/S{}_salmon_out'.format(i) for i in range(n_samples)]
+        for sample_path in sample_paths:
+            write_salmon(sample_path, names, rng)
+
+        print('{} transcripts, {} samples, ms per sample'.format(n_transcripts, n_samples))
+        for label, reader, kwargs in [('salmon', parse.read_salmon, {'isoforms': True}),
+                                      ('kallisto', parse.read_kallisto, {})]:
+            slow = time_reader(reader, sample_paths, **kwargs)
+            fast = time_reader(reader, sample_paths, fast=True, **kwargs)
+            print('{:10s} pandas {:8.1f}  fastparse {:8.1f}  speedup {:.1f}x'
+                  .format(label, slow * 1e3, fast * 1e3, slow / fast))
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,110 @@
+''' Check that starting readquant stays fast, with python -X importtime.
+
+Importing the package and its command line interface must not load heavy
+dependencies, which are only imported by the commands needing them. Exits
+with status 1 if any of them is imported, or if the import takes longer
+than the budget.
+
+usage: python benchmarks/bench_startup.py [--budget-ms MS] [--repeat N]
+'''
+from __future__ import print_function
+
+import re
+import sys
+import argparse
+import subprocess
+
+
+HEAVY_MODULES = ('pandas', 'numpy', 'scipy', 'sklearn', 'pyarrow', 'pycurl', 'requests', 'tqdm')
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(statement):
+    ''' Run statement in a new interpreter with -X importtime.
+
+    Returns
+    -------
+    A list of (module, self microseconds, cumulative microseconds, depth).
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                            universal_newlines=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    return times
+
+
+def _package_imports(times, package):
+    ''' The imports made while importing package, including those of other
+    modules it imports.
+    '''
+    # Modules are listed after the modules they import, so everything since
+    # the last top level import belongs to the next top level import.
+    imports = []
+    group = []
+    for entry in times:
+        group.append(entry)
+        module, _, _, depth = entry
+        if depth == 0:
+            if module.split('.')[0] == package:
+                imports.extend(group)
+
+            group = []
+
+    return imports
+
+
+def check(statement, package, budget_ms, repeat=3):
+    ''' Import time of package when running statement, the best of repeat
+    runs, and the heavy modules it imported.
+    '''
+    best = None
+    for _ in range(repeat):
+        times = _package_imports(import_times(statement), package)
+        total = sum(c for _, _, c, depth in times if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, times)
+
+    total, times = best
+    modules = {m.split('.')[0] for m, _, _, _ in times}
+    heavy = sorted(modules.intersection(HEAVY_MODULES))
+
+    print('{:32s} {:8.1f} ms'.format(statement, total / 1e3))
+    for module, self_us, _, _ in sorted(times, key=lambda t: -t[1])[:5]:
+        print('    {:40s} {:8.1f} ms'.format(module, self_us / 1e3))
+
+    failures = []
+    if heavy:
+        failures.append('{} imports {}'.format(statement, ', '.join(heavy)))
+
+    if total / 1e3 > budget_ms:
+        failures.append('{} took {:.1f} ms, more than {:g} ms'.format(statement, total / 1e3, budget_ms))
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the startup time of readquant.')
+    parser.add_argument('--budget-ms', type=float, default=150.,
+                        help='Longest acceptable import time of the command line interface.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    failures = []
+    failures += check('import readquant', 'readquant', args.budget_ms, args.repeat)
+    failures += check('import readquant.cli', 'readquant', args.budget_ms, args.repeat)
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
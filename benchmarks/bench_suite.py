@@ -0,0 +1,250 @@
+''' Throughput and peak memory of readquant's parsing and QC functions on a
+synthetic result tree, see synthetic.py.
+
+Every benchmark runs in a freshly forked process, so its peak memory is
+measured on its own: 'peak MB' is the growth of the maximum resident set
+size during the call (including worker processes when n_jobs is not 1).
+Results can be saved with --output and compared to an earlier run, e.g.
+of the previous release, with --baseline.
+
+usage: python benchmarks/bench_suite.py [--samples N] [--transcripts N] [--reads N]
+                                        [--root DIR] [--n-jobs N] [--only NAME]
+                                        [--output results.json] [--baseline results.json]
+'''
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import multiprocessing
+
+import synthetic
+
+
+def _max_rss_mb():
+    ''' The maximum resident set size of this process and its finished
+    children, in MB.
+    '''
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    usage = [resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF,
+                                                           resource.RUSAGE_CHILDREN)]
+    return max(usage) / scale
+
+
+def _input_bytes(files):
+    return sum(os.path.getsize(f) for f in files)
+
+
+def _sample_files(pattern, names):
+    files = []
+    for sample_path in glob.glob(pattern):
+        files.extend(os.path.join(sample_path, n) for n in names
+                     if os.path.exists(os.path.join(sample_path, n)))
+
+    return files
+
+
+def benchmarks(patterns, n_jobs=1):
+    ''' The benchmarks to run on a tree made by synthetic.make_tree.
+
+    Returns
+    -------
+    A list of (name, function, number of samples, input files). Functions
+    take no arguments.
+    '''
+    import readquant
+    from readquant import parse, fastq
+    from readquant.utils import PosModel
+
+    jobs = {'n_jobs': n_jobs, 'executor': 'process' if n_jobs != 1 else 'thread'}
+    cases = []
+
+    def add(name, func, pattern, files):
+        cases.append((name, func, len(glob.glob(pattern)), files))
+
+    for version in synthetic.SALMON_VERSIONS:
+        pattern = patterns.get('salmon-' + version)
+        if pattern is None:
+            continue
+
+        for isoforms, quant_file in ((False, 'quant.genes.sf'), (True, 'quant.sf')):
+            level = 'transcripts' if isoforms else 'genes'
+            add('read_quants salmon {} {}'.format(version, level),
+                lambda p=pattern, v=version, i=isoforms:
+                    readquant.read_quants(p, tool='salmon', version=v, isoforms=i, **jobs),
+                pattern, _sample_files(pattern, [quant_file]))
+
+        add('read_quants salmon {} transcripts fast'.format(version),
+            lambda p=pattern, v=version:
+                readquant.read_quants(p, tool='salmon', version=v, isoforms=True, fast=True, **jobs),
+            pattern, _sample_files(pattern, ['quant.sf']))
+
+        meta = {'0.7.2': 'aux_info/meta_info.json', '0.6.0': 'aux/meta_info.json',
+                '0.4.0': 'logs/salmon_quant.log'}[version]
+        add('read_qcs salmon {}'.format(version),
+            lambda p=pattern, v=version: readquant.read_qcs(p, tool='salmon', version=v, **jobs),
+            pattern, _sample_files(pattern, ['libParams/flenDist.txt', meta]))
+
+    pattern = patterns.get('salmon-0.7.2')
+    if pattern is not None:
+        pos_files = glob.glob(pattern + '/aux_info/obs3_pos.gz')
+        add('read_salmon_3p_bias',
+            lambda p=pattern: parse.read_salmon_3p_bias(p + '/', **jobs),
+            pattern, pos_files)
+
+        def from_file(pos_files=pos_files):
+            for f in pos_files:
+                PosModel().from_file(f)
+
+        add('PosModel.from_file', from_file, pattern, pos_files)
+
+    if 'kallisto' in patterns:
+        pattern = patterns['kallisto']
+        add('read_quants kallisto', lambda p=pattern: readquant.read_quants(p, tool='kallisto', **jobs),
+            pattern, _sample_files(pattern, ['abundance.tsv']))
+
+    if 'cufflinks' in patterns:
+        pattern = patterns['cufflinks']
+        for isoforms, quant_file in ((False, 'genes.fpkm_tracking'), (True, 'isoforms.fpkm_tracking')):
+            add('read_quants cufflinks {}'.format('transcripts' if isoforms else 'genes'),
+                lambda p=pattern, i=isoforms:
+                    readquant.read_quants(p, tool='cufflinks', isoforms=i, **jobs),
+                pattern, _sample_files(pattern, [quant_file]))
+
+    if 'tophat' in patterns:
+        pattern = patterns['tophat']
+        add('read_qcs tophat', lambda p=pattern: readquant.read_qcs(p, tool='tophat', **jobs),
+            pattern, _sample_files(pattern, ['align_summary.txt']))
+
+    if 'fastq' in patterns:
+        pattern = patterns['fastq']
+        pairs = [(r1, r1.replace('_R1.', '_R2.')) for r1 in sorted(glob.glob(pattern))]
+
+        def concatamer_filter():
+            out_dir = tempfile.mkdtemp()
+            try:
+                for fq1, fq2 in pairs:
+                    fastq.filter_concatamers(fq1, fq2, os.path.join(out_dir, 'R1.fastq.gz'),
+                                             os.path.join(out_dir, 'R2.fastq.gz'),
+                                             [synthetic.ADAPTER], threshold=2, n_jobs=n_jobs)
+            finally:
+                shutil.rmtree(out_dir)
+
+        def adapter_histogram():
+            for fq1, fq2 in pairs:
+                fastq.adapter_histogram(fq1, fq2, [synthetic.ADAPTER], n_jobs=n_jobs)
+
+        files = [f for pair in pairs for f in pair]
+        add('concatamer_filter', concatamer_filter, pattern, files)
+        add('adapter_histogram', adapter_histogram, pattern, files)
+
+    return cases
+
+
+def _run_case(func, queue):
+    # Progress bars would drown the results.
+    sys.stderr = open(os.devnull, 'w')
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        before = _max_rss_mb()
+        start = time.time()
+        func()
+        queue.put({'seconds': time.time() - start, 'peak_mb': _max_rss_mb() - before})
+    except Exception as e:
+        queue.put({'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+def run_case(func):
+    ''' Run func in a forked process, returning its wall time and peak memory
+    growth.
+    '''
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(func, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--transcripts', type=int, default=20000)
+    parser.add_argument('--reads', type=int, default=100000, help='Read pairs per FASTQ sample.')
+    parser.add_argument('--fastq-samples', type=int, default=4)
+    parser.add_argument('--root', default=None,
+                        help='Existing tree from synthetic.py, or where to write one. '
+                             'By default a temporary tree is written and removed.')
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--only', action='append', default=[],
+                        help='Only run benchmarks whose name contains this, can be repeated.')
+    parser.add_argument('--output', default=None, help='Save the results as JSON.')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare to.')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp()
+    try:
+        tools = [t for t in synthetic.TOOLS if t != 'fastq']
+        if any(os.path.isdir(os.path.join(root, t)) for t in synthetic.TOOLS):
+            patterns = {t: p for t, p in synthetic.tree_patterns(root).items() if glob.glob(p)}
+        else:
+            patterns = synthetic.make_tree(root, args.samples, args.transcripts, tools=tools)
+            patterns.update(synthetic.make_tree(root, args.fastq_samples, n_reads=args.reads,
+                                                tools=['fastq']))
+
+        baseline = {}
+        if args.baseline is not None:
+            with open(args.baseline) as fh:
+                baseline = json.load(fh)['results']
+
+        results = {}
+        print('{:42s} {:>7s} {:>9s} {:>10s} {:>8s} {:>8s}{}'.format(
+            'benchmark', 'samples', 'seconds', 'samples/s', 'MB/s', 'peak MB',
+            '  vs baseline' if baseline else ''))
+
+        for name, func, n_samples, files in benchmarks(patterns, n_jobs=args.n_jobs):
+            if args.only and not any(o in name for o in args.only):
+                continue
+
+            result = run_case(func)
+            if 'error' in result:
+                print('{:42s} {}'.format(name, result['error']))
+                continue
+
+            result['samples'] = n_samples
+            result['input_mb'] = _input_bytes(files) / 1024. ** 2
+            results[name] = result
+
+            seconds = max(result['seconds'], 1e-9)
+            compare = ''
+            if name in baseline:
+                compare = '  {:.2f}x'.format(baseline[name]['seconds'] / seconds)
+
+            print('{:42s} {:7d} {:9.3f} {:10.1f} {:8.1f} {:8.1f}{}'.format(
+                name, n_samples, result['seconds'], n_samples / seconds,
+                result['input_mb'] / seconds, result['peak_mb'], compare))
+
+        if args.output is not None:
+            import readquant
+
+            with open(args.output, 'w') as fh:
+                json.dump({'n_jobs': args.n_jobs, 'root': root,
+                           'readquant': os.path.dirname(readquant.__file__),
+                           'results': results}, fh, indent=2)
+
+    finally:
+        if args.root is None:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
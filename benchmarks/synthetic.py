@@ -0,0 +1,309 @@
+''' Write realistic synthetic quantification results, to benchmark readquant
+without real data.
+
+Every tool gets its own directory under the root:
+
+    salmon-0.7.2/S0000_salmon_out/  quant.sf, quant.genes.sf,
+                                    aux_info/meta_info.json, aux_info/*_pos.gz,
+                                    libParams/flenDist.txt
+    salmon-0.6.0/S0000_salmon_out/  as 0.7.2 but with aux/meta_info.json
+    salmon-0.4.0/S0000_salmon_out/  commented headerless quant files and
+                                    logs/salmon_quant.log
+    kallisto/S0000/                 abundance.tsv
+    cufflinks/S0000/                genes.fpkm_tracking, isoforms.fpkm_tracking
+    tophat/S0000/                   align_summary.txt
+    fastq/S0000_R{1,2}.fastq.gz     paired reads, some with adapter concatamers
+
+usage: python benchmarks/synthetic.py ROOT [--samples N] [--transcripts N] [--reads N]
+'''
+from __future__ import print_function
+
+import os
+import gzip
+import json
+import argparse
+
+import numpy as np
+
+
+SALMON_VERSIONS = ('0.7.2', '0.6.0', '0.4.0')
+TOOLS = tuple('salmon-' + v for v in SALMON_VERSIONS) + ('kallisto', 'cufflinks', 'tophat', 'fastq')
+
+ADAPTER = 'CTGTCTCTTATACACATCT'
+
+_POS_KINDS = ('obs5', 'obs3', 'exp5', 'exp3')
+_POS_LENGTH_BINS = (1334, 2104, 2977, 4389, 100000)
+
+
+class Index(object):
+    ''' The transcripts and genes shared by all samples of a tree.
+
+    Parameters
+    ----------
+    n_transcripts, int
+        Number of transcripts, which are grouped into genes of one to seven
+        transcripts, plus the 92 ERCC spike-ins.
+
+    seed, int, default 0
+    '''
+    def __init__(self, n_transcripts, seed=0):
+        rng = np.random.RandomState(seed)
+        ercc = ['ERCC-{:05d}'.format(i) for i in range(92)]
+
+        self.transcripts = np.array(['ENST{:011d}.{}'.format(i, i % 5 + 1)
+                                     for i in range(n_transcripts)] + ercc)
+        sizes = rng.randint(1, 8, size=n_transcripts)
+        gene_of = np.repeat(np.arange(len(sizes)), sizes)[:n_transcripts]
+        self.gene_of = np.concatenate([gene_of, gene_of.max(initial=-1) + 1 + np.arange(len(ercc))])
+        self.genes = np.array(['ENSG{:011d}.{}'.format(i, i % 3 + 1)
+                               for i in range(self.gene_of.max(initial=-1) + 1 - len(ercc))] + ercc)
+        self.lengths = rng.lognormal(7.5, 0.6, size=len(self.transcripts)).astype(int) + 200
+
+
+def _expression(index, rng, detected=0.3):
+    ''' TPM, effective lengths and read counts of one sample.
+    '''
+    n = len(index.transcripts)
+    tpm = rng.lognormal(1., 2., size=n) * (rng.rand(n) < detected)
+    tpm *= 1e6 / max(tpm.sum(), 1e-12)
+    eff_length = np.maximum(index.lengths - rng.normal(250, 20, size=n), 1.)
+    reads = tpm * eff_length
+    reads *= rng.randint(500000, 5000000) / max(reads.sum(), 1e-12)
+
+    return tpm, eff_length, reads
+
+
+def _gene_sums(index, values):
+    return np.bincount(index.gene_of, weights=values, minlength=len(index.genes))
+
+
+def _column_text(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        text = np.full(len(values), '0', dtype=object)
+        nonzero = np.flatnonzero(values)
+        text[nonzero] = ['{:.6g}'.format(v) for v in values[nonzero]]
+        return text
+
+    return values.astype(str)
+
+
+def _write_table(path, columns, header=True, comments=()):
+    ''' Write a tab separated table of columns, a dict from name to values,
+    which are all arrays of the same length or scalars.
+    '''
+    n_rows = max(np.size(v) for v in columns.values())
+    texts = [_column_text(np.broadcast_to(v, n_rows)) for v in columns.values()]
+    with open(path, 'w') as fh:
+        for comment in comments:
+            fh.write('# {}\n'.format(comment))
+
+        if header:
+            fh.write('\t'.join(columns) + '\n')
+
+        fh.write('\n'.join('\t'.join(row) for row in zip(*texts)) + '\n')
+
+
+def _pos_model(rng, n_bins=20):
+    ''' Bytes of a Salmon positional bias model file, before compression.
+    '''
+    parts = [np.array([len(_POS_LENGTH_BINS)], dtype='I').tobytes(),
+             np.array(_POS_LENGTH_BINS, dtype='I').tobytes()]
+    for _ in _POS_LENGTH_BINS:
+        values = rng.gamma(5., size=n_bins) * np.linspace(0.5, 1.5, n_bins)
+        parts.append(np.array([n_bins], dtype='I').tobytes())
+        parts.append((values / values.sum()).tobytes())
+
+    return b''.join(parts)
+
+
+def _flen_dist(rng, max_length=1001):
+    flen = np.exp(-0.5 * ((np.arange(max_length) - rng.normal(250, 30)) / 60.) ** 2)
+    return flen / flen.sum()
+
+
+def write_salmon(sample_path, index, rng, version='0.7.2'):
+    ''' Write a Salmon result directory as made by the given version.
+    '''
+    tpm, eff_length, reads = _expression(index, rng)
+    gene_tpm = _gene_sums(index, tpm)
+    gene_reads = _gene_sums(index, reads)
+    gene_length = _gene_sums(index, index.lengths) / np.bincount(index.gene_of)
+    num_processed = int(reads.sum() / rng.uniform(0.4, 0.9))
+    percent_mapped = 100. * reads.sum() / num_processed
+
+    os.makedirs(sample_path + '/libParams')
+    if version == '0.4.0':
+        comments = ['Salmon v0.4.0', 'Name\tLength\tTPM\tNumReads']
+        _write_table(sample_path + '/quant.sf', {'Name': index.transcripts, 'Length': index.lengths,
+                                                 'TPM': tpm, 'NumReads': reads},
+                     header=False, comments=comments)
+        _write_table(sample_path + '/quant.genes.sf', {'Name': index.genes, 'Length': gene_length,
+                                                       'TPM': gene_tpm, 'NumReads': gene_reads},
+                     header=False, comments=comments)
+
+        os.makedirs(sample_path + '/logs')
+        with open(sample_path + '/logs/salmon_quant.log', 'w') as fh:
+            fh.write('[jointLog] [info] parsing read library format\n')
+            for observed in np.linspace(0, num_processed, 5).astype(int)[1:]:
+                fh.write('[jointLog] [info] Observed {} total fragments\n'.format(observed))
+
+            fh.write('[jointLog] [info] Overall mapping rate = {:.4f}%\n'.format(percent_mapped))
+
+    else:
+        _write_table(sample_path + '/quant.sf', {'Name': index.transcripts, 'Length': index.lengths,
+                                                 'EffectiveLength': eff_length, 'TPM': tpm,
+                                                 'NumReads': reads})
+        _write_table(sample_path + '/quant.genes.sf', {'Name': index.genes, 'Length': gene_length,
+                                                       'EffectiveLength': gene_length - 250.,
+                                                       'TPM': gene_tpm, 'NumReads': gene_reads})
+
+        aux = sample_path + ('/aux_info' if version == '0.7.2' else '/aux')
+        os.makedirs(aux)
+        with open(aux + '/meta_info.json', 'w') as fh:
+            json.dump({'salmon_version': version, 'num_processed': num_processed,
+                       'num_mapped': int(reads.sum()), 'percent_mapped': percent_mapped,
+                       'num_bias_bins': 4096, 'library_types': ['IU']}, fh, indent=4)
+
+        for kind in _POS_KINDS:
+            with gzip.open('{}/{}_pos.gz'.format(aux, kind), 'wb', compresslevel=1) as fh:
+                fh.write(_pos_model(rng))
+
+    with open(sample_path + '/libParams/flenDist.txt', 'w') as fh:
+        fh.write('\t'.join('{:.6g}'.format(f) for f in _flen_dist(rng)) + '\n')
+
+
+def write_kallisto(sample_path, index, rng):
+    tpm, eff_length, reads = _expression(index, rng)
+    os.makedirs(sample_path)
+    _write_table(sample_path + '/abundance.tsv', {'target_id': index.transcripts,
+                                                  'length': index.lengths, 'eff_length': eff_length,
+                                                  'est_counts': reads, 'tpm': tpm})
+
+
+def _fpkm_tracking(ids, gene_ids, lengths, fpkm):
+    return {'tracking_id': ids, 'class_code': '-', 'nearest_ref_id': '-', 'gene_id': gene_ids,
+            'gene_short_name': '-', 'tss_id': '-', 'locus': 'chr1:1-1000', 'length': lengths,
+            'coverage': fpkm * 0.1, 'FPKM': fpkm, 'FPKM_conf_lo': fpkm * 0.8,
+            'FPKM_conf_hi': fpkm * 1.2, 'FPKM_status': 'OK'}
+
+
+def write_cufflinks(sample_path, index, rng):
+    fpkm, _, _ = _expression(index, rng)
+    gene_ids = index.genes[index.gene_of]
+    os.makedirs(sample_path)
+    _write_table(sample_path + '/isoforms.fpkm_tracking',
+                 _fpkm_tracking(index.transcripts, gene_ids, index.lengths, fpkm))
+    _write_table(sample_path + '/genes.fpkm_tracking',
+                 _fpkm_tracking(index.genes, index.genes, _gene_sums(index, index.lengths),
+                                _gene_sums(index, fpkm)))
+
+
+def write_tophat(sample_path, rng):
+    os.makedirs(sample_path)
+    n_input = rng.randint(1000000, 20000000)
+    left, right = rng.uniform(0.6, 0.95, size=2)
+    with open(sample_path + '/align_summary.txt', 'w') as fh:
+        for name, rate in (('Left', left), ('Right', right)):
+            fh.write('{} reads:\n'.format(name))
+            fh.write('          Input     : {:9d}\n'.format(n_input))
+            fh.write('           Mapped   : {:9d} ({:4.1f}% of input)\n'
+                     .format(int(n_input * rate), 100 * rate))
+            fh.write('            of these: {:9d} ( 2.1%) have multiple alignments (9 have >20)\n'
+                     .format(int(n_input * rate * 0.021)))
+
+        fh.write('{:4.1f}% overall read mapping rate.\n\n'.format(50 * (left + right)))
+        fh.write('Aligned pairs: {:9d}\n'.format(int(n_input * min(left, right))))
+        fh.write('{:4.1f}% concordant pair alignment rate.\n'.format(90 * min(left, right)))
+
+
+def write_fastq_pair(path1, path2, rng, n_reads=100000, read_length=75,
+                     concatamer_rate=0.05, adapter=ADAPTER):
+    ''' Write gzipped paired FASTQ files where a fraction concatamer_rate of
+    read pairs have one to three copies of adapter in each mate.
+    '''
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)
+    adapter = np.frombuffer(adapter.encode(), dtype=np.uint8)
+    quality = b'I' * read_length
+
+    for mate, path in enumerate((path1, path2), 1):
+        reads = bases[rng.randint(4, size=(n_reads, read_length))]
+        copies = np.where(rng.rand(n_reads) < concatamer_rate, rng.randint(1, 4, size=n_reads), 0)
+        for n in (1, 2, 3):
+            rows = np.flatnonzero(copies == n)
+            for i in range(n):
+                start = i * (len(adapter) + 2)
+                reads[rows, start:start + len(adapter)] = adapter
+
+        with gzip.open(path, 'wb', compresslevel=1) as fh:
+            for i, read in enumerate(reads):
+                fh.write(b'@read%d/%d\n%s\n+\n%s\n' % (i, mate, read.tobytes(), quality))
+
+
+def make_tree(root, n_samples=100, n_transcripts=20000, n_reads=100000, tools=TOOLS, seed=0):
+    ''' Write n_samples synthetic samples of every tool in tools under root.
+
+    Returns
+    -------
+    A dict from tool to the glob pattern of its samples.
+    '''
+    index = Index(n_transcripts, seed=seed)
+    rng = np.random.RandomState(seed)
+    for tool in tools:
+        tool_dir = os.path.join(root, tool)
+        os.makedirs(tool_dir, exist_ok=True)
+
+        for i in range(n_samples):
+            name = 'S{:04d}'.format(i)
+            if tool.startswith('salmon-'):
+                write_salmon(os.path.join(tool_dir, name + '_salmon_out'), index, rng,
+                             version=tool[len('salmon-'):])
+            elif tool == 'kallisto':
+                write_kallisto(os.path.join(tool_dir, name), index, rng)
+            elif tool == 'cufflinks':
+                write_cufflinks(os.path.join(tool_dir, name), index, rng)
+            elif tool == 'tophat':
+                write_tophat(os.path.join(tool_dir, name), rng)
+            elif tool == 'fastq':
+                write_fastq_pair(os.path.join(tool_dir, name + '_R1.fastq.gz'),
+                                 os.path.join(tool_dir, name + '_R2.fastq.gz'), rng, n_reads=n_reads)
+            else:
+                raise ValueError('Unknown tool: {}'.format(tool))
+
+    return tree_patterns(root, tools)
+
+
+def tree_patterns(root, tools=TOOLS):
+    ''' The glob patterns of the samples of every tool in a tree under root.
+    '''
+    patterns = {}
+    for tool in tools:
+        if tool.startswith('salmon-'):
+            patterns[tool] = os.path.join(root, tool, '*_salmon_out')
+        elif tool == 'fastq':
+            patterns[tool] = os.path.join(root, tool, '*_R1.fastq.gz')
+        else:
+            patterns[tool] = os.path.join(root, tool, 'S*')
+
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic quantification results.')
+    parser.add_argument('root')
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--transcripts', type=int, default=20000)
+    parser.add_argument('--reads', type=int, default=100000, help='Read pairs per FASTQ sample.')
+    parser.add_argument('--tool', action='append', choices=TOOLS,
+                        help='Only write these tools, can be repeated.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    patterns = make_tree(args.root, args.samples, args.transcripts, args.reads,
+                         tools=args.tool or TOOLS, seed=args.seed)
+    for tool, pattern in patterns.items():
+        print('{:14s} {}'.format(tool, pattern))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,46 @@
-from .parse import read_quants
-from .parse import read_qcs
+import importlib
 
-from .data import ERCC
+# Public names and the modules they are defined in. Modules are only
+# imported when a name is first used, so importing readquant (e.g. to run
+# the command line interface) does not load pandas and friends up front.
+_EXPORTS = {
+    'read_quants': 'parse',
+    'read_qcs': 'parse',
+
+    'QuantMatrix': 'store',
+
+    'SampleManifest': 'manifest',
+
+    'bio_qc': 'qc',
+
+    'aggregate_genes': 'genes',
+    'aggregate_lengths': 'genes',
+
+    'read_sparse': 'formats',
+    'write_sparse': 'formats',
+    'read_table': 'formats',
+    'write_table': 'formats',
+
+    'ERCC': 'data'
+}
+
+_SUBMODULES = ('archive', 'assemble', 'cache', 'cli', 'data', 'download', 'fasta', 'fastparse', 'fastq',
+               'formats', 'genes', 'manifest', 'parse', 'profile', 'qc', 'store', 'utils')
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module('.' + _EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_SUBMODULES))
@@ -0,0 +1,178 @@
+import os
+import gzip
+import queue
+import fnmatch
+import tarfile
+import threading
+
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+_DONE = object()
+
+
+def split_archive_pattern(pattern):
+    ''' Split a pattern of samples inside a tar archive, like
+    'results.tar.gz/salmon/*_salmon_out', into the archive and the glob
+    pattern of samples in it.
+
+    Returns
+    -------
+    archive, str
+        Path of the archive, or None if pattern is not inside an archive.
+
+    member_pattern, str
+        Glob pattern of the sample directories in the archive, '' for all
+        of them. The pattern itself if it is not inside an archive.
+    '''
+    parts = pattern.rstrip('/').split('/')
+    for i, part in enumerate(parts):
+        if part.endswith(ARCHIVE_SUFFIXES):
+            archive = '/'.join(parts[:i + 1])
+            if os.path.isfile(archive):
+                return archive, '/'.join(parts[i + 1:])
+
+    return None, pattern
+
+
+def _member_sample(name, members):
+    ''' The sample directory and wanted file a member of the archive is,
+    or None if it is not one of members. Members may be gzip compressed.
+    '''
+    for relative in members:
+        for candidate in (relative, relative + '.gz'):
+            if name == candidate:
+                return '', relative, candidate
+
+            if name.endswith('/' + candidate):
+                return name[:-len(candidate) - 1], relative, candidate
+
+    return None
+
+
+def _matches(sample, pattern_parts):
+    ''' Whether a sample directory matches a glob pattern split into path
+    components. Like glob, wildcards do not match across '/'.
+    '''
+    if not pattern_parts:
+        return True
+
+    parts = sample.split('/')
+    if len(parts) != len(pattern_parts):
+        return False
+
+    return all(fnmatch.fnmatchcase(p, q) for p, q in zip(parts, pattern_parts))
+
+
+def _stream_samples(archive, members, pattern):
+    ''' Read the wanted members of every sample in one pass through the
+    archive, yielding (sample, files) as soon as all of them are found.
+    '''
+    pattern_parts = [p for p in pattern.split('/') if p]
+    pending = {}
+    # 'r|*' reads the archive as a stream, with transparent decompression,
+    # rather than seeking around it to build an index of members first.
+    with tarfile.open(archive, 'r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+
+            name = member.name[2:] if member.name.startswith('./') else member.name
+            match = _member_sample(name, members)
+            if match is None:
+                continue
+
+            sample, relative, candidate = match
+            if not _matches(sample, pattern_parts):
+                continue
+
+            data = tar.extractfile(member).read()
+            if candidate != relative:
+                data = gzip.decompress(data)
+
+            files = pending.setdefault(sample, {})
+            files[relative] = data
+            if len(files) == len(members):
+                yield sample, pending.pop(sample)
+
+    # Samples missing some of the members, which the parser reports.
+    for sample, files in pending.items():
+        yield sample, files
+
+
+def _put(items, item, stop):
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+
+        except queue.Full:
+            pass
+
+    return False
+
+
+def iter_archive_samples(archive, members, pattern='', max_pending=8):
+    ''' Stream the files of samples out of a tar archive.
+
+    The archive is read once from start to end in a background thread, so
+    decompressing the next samples overlaps with parsing the current one,
+    and no files are extracted to disk. At most max_pending samples are
+    held in memory waiting to be parsed.
+
+    Parameters
+    ----------
+    archive, str
+        Path of a tar archive, optionally compressed with gzip, bzip2 or xz.
+
+    members, list of str
+        Files to read for each sample, relative to the sample directory,
+        e.g. ['quant.sf']. Gzip compressed members like 'quant.sf.gz' are
+        also found, and decompressed.
+
+    pattern, str, default ''
+        Glob pattern of the sample directories inside the archive. By
+        default every directory with the members is a sample.
+
+    max_pending, int, default 8
+        Number of read samples which may wait to be parsed.
+
+    Yields
+    ------
+    Tuples (sample_path, files), where sample_path is the sample directory
+    below archive, e.g. 'results.tar.gz/S1_salmon_out', and files is a dict
+    from the members found for the sample to their contents in bytes.
+    Samples are in archive order.
+    '''
+    items = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in _stream_samples(archive, members, pattern):
+                if not _put(items, (item, None), stop):
+                    return
+
+        except Exception as e:
+            _put(items, (None, e), stop)
+            return
+
+        _put(items, (_DONE, None), stop)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+
+            if item is _DONE:
+                return
+
+            sample, files = item
+            yield (archive + '/' + sample if sample else archive), files
+
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+
+class _Assembler(object):
+    ''' Shared bookkeeping of the global feature index for assemblers.
+    '''
+    def __init__(self):
+        self.index = None
+        self.columns = []
+
+    def _codes(self, index):
+        ''' Map the features in index to codes in the global index, adding
+        features which have not been seen before.
+
+        Returns None if index is identical to the global index.
+        '''
+        if self.index is None:
+            self.index = index
+            return None
+
+        if index is self.index or index.equals(self.index):
+            return None
+
+        if not index.is_unique:
+            raise ValueError('Sample index has duplicate features')
+
+        codes = self.index.get_indexer(index)
+        is_new = codes < 0
+        if is_new.any():
+            codes[is_new] = np.arange(len(self.index), len(self.index) + is_new.sum())
+            self.index = self.index.append(index[is_new])
+
+        return codes
+
+
+class DenseAssembler(_Assembler):
+    ''' Helper class for assembling per sample expression vectors into one
+    genes x samples matrix.
+
+    All features seen in any sample are collected in one global index where
+    every feature has an integer code, and values are written straight into
+    a preallocated 2D array. In the common case where every sample has the
+    same index as the first one, no lookups are made at all. When samples
+    have different sets of features the result is an outer join, with NaN
+    for features missing in a sample.
+    '''
+    def __init__(self, n_samples=0):
+        '''
+
+        Parameters
+        ----------
+        n_samples, int, default 0
+            The expected number of samples, used to size the matrix up front.
+            More samples than this can still be added.
+
+        '''
+        super(DenseAssembler, self).__init__()
+        self.values = None
+        self._n_samples = n_samples
+
+    def _allocate(self, n_rows, n_cols):
+        # Fortran order keeps every sample contiguous, which is also the
+        # layout pandas uses internally for a single float block.
+        values = np.full((n_rows, n_cols), np.nan, order='F')
+        if self.values is not None:
+            old_rows, old_cols = self.values.shape
+            values[:old_rows, :old_cols] = self.values
+
+        self.values = values
+
+    def add(self, name, quant):
+        ''' Add the expression vector of a sample.
+
+        Parameters
+        ----------
+        name, str
+            The name of the sample, becomes the column label.
+
+        quant, pandas.Series
+            Expression values of the sample, indexed by feature.
+
+        '''
+        col = len(self.columns)
+        codes = self._codes(quant.index)
+        if self.values is None:
+            self._allocate(len(quant), max(self._n_samples, 1))
+
+        n_rows, n_cols = self.values.shape
+        if len(self.index) > n_rows or col >= n_cols:
+            # Grow geometrically so repeated growth stays amortised linear.
+            new_rows = n_rows if len(self.index) <= n_rows else max(len(self.index), 2 * n_rows)
+            new_cols = n_cols if col < n_cols else 2 * n_cols
+            self._allocate(new_rows, new_cols)
+
+        if codes is None:
+            self.values[:len(quant), col] = quant.values
+        else:
+            self.values[codes, col] = quant.values
+
+        self.columns.append(name)
+
+    def result(self):
+        ''' Wrap the assembled values in a DataFrame.
+
+        Returns
+        -------
+        A pandas.DataFrame where columns are samples and rows are features.
+        '''
+        if self.index is None:
+            return pd.DataFrame()
+
+        values = self.values[:len(self.index), :len(self.columns)]
+        return pd.DataFrame(values, index=self.index,
+                            columns=pd.Index(self.columns), copy=False)
+
+
+class SparseAssembler(_Assembler):
+    ''' Helper class for assembling per sample expression vectors into one
+    sparse genes x samples matrix.
+
+    Only the non-zero values of each sample are kept, so the matrix is built
+    in compressed sparse column form without ever being dense. Features
+    missing from a sample are treated as zero.
+    '''
+    def __init__(self, n_samples=0):
+        super(SparseAssembler, self).__init__()
+        self._data = []
+        self._indices = []
+        self._nnz = [0]
+
+    def add(self, name, quant):
+        ''' Add the expression vector of a sample.
+
+        Parameters
+        ----------
+        name, str
+            The name of the sample, becomes the column label.
+
+        quant, pandas.Series
+            Expression values of the sample, indexed by feature.
+
+        '''
+        codes = self._codes(quant.index)
+        values = np.asarray(quant.values, dtype=np.float64)
+        nonzero = np.flatnonzero(values)
+        rows = nonzero if codes is None else codes[nonzero]
+
+        self._data.append(values[nonzero])
+        self._indices.append(rows.astype(np.int64))
+        self._nnz.append(self._nnz[-1] + len(nonzero))
+        self.columns.append(name)
+
+    def matrix(self):
+        ''' Assemble the values in a scipy.sparse.csc_matrix.
+
+        Returns
+        -------
+        A scipy.sparse.csc_matrix with features as rows and samples as
+        columns, in the order of self.index and self.columns.
+        '''
+        from scipy import sparse
+
+        n_rows = 0 if self.index is None else len(self.index)
+        shape = (n_rows, len(self.columns))
+        if not self.columns:
+            return sparse.csc_matrix(shape)
+
+        data = np.concatenate(self._data)
+        indices = np.concatenate(self._indices)
+        indptr = np.array(self._nnz, dtype=np.int64)
+        if n_rows < np.iinfo(np.int32).max and len(data) < np.iinfo(np.int32).max:
+            indices = indices.astype(np.int32)
+            indptr = indptr.astype(np.int32)
+
+        matrix = sparse.csc_matrix((data, indices, indptr), shape=shape)
+        matrix.sort_indices()
+        return matrix
+
+    def result(self):
+        ''' Wrap the assembled values in a sparse backed DataFrame.
+
+        Returns
+        -------
+        A pandas.DataFrame with sparse columns, where columns are samples and
+        rows are features.
+        '''
+        if self.index is None:
+            return pd.DataFrame()
+
+        return pd.DataFrame.sparse.from_spmatrix(self.matrix(), index=self.index,
+                                                 columns=pd.Index(self.columns))
+
+
+class LayeredAssembler(object):
+    ''' Helper class for assembling per sample tables with several columns,
+    e.g. TPM and NumReads, into one genes x samples matrix per column.
+
+    Each column is added to its own assembler, so the layers share the
+    sample order but are otherwise built exactly like single matrices.
+    '''
+    def __init__(self, assemblers):
+        '''
+
+        Parameters
+        ----------
+        assemblers, dict
+            Maps each column to the assembler collecting it, e.g. a
+            DenseAssembler or a readquant.store.StoreWriter.
+
+        '''
+        self.assemblers = assemblers
+
+    def add(self, name, quant):
+        ''' Add the expression table of a sample.
+
+        Parameters
+        ----------
+        name, str
+            The name of the sample, becomes the column label.
+
+        quant, pandas.DataFrame
+            Expression values of the sample, indexed by feature, with a
+            column for every layer.
+
+        '''
+        for column, assembler in self.assemblers.items():
+            assembler.add(name, quant[column])
+
+    def result(self):
+        ''' The assembled layers.
+
+        Returns
+        -------
+        A dict mapping each column to the result of its assembler.
+        '''
+        return {column: assembler.result() for column, assembler in self.assemblers.items()}
@@ -0,0 +1,426 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT_VERSION = 1
+
+
+def _file_identity(path):
+    ''' Identity of a file used in cache keys: path, size and mtime.
+    '''
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return [path, None, None]
+
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+def _save_entry(fh, arrays):
+    np.savez(fh, **arrays)
+
+
+def _save_compressed_entry(fh, arrays):
+    np.savez_compressed(fh, **arrays)
+
+
+def _atomic_save(path, save, obj):
+    ''' Write a file with save(fh, obj) under a temporary name and move it
+    into place, so concurrent readers never see partial files.
+    '''
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            save(fh, obj)
+
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _cache_files(directories):
+    ''' (mtime, size, path) of every complete file in directories.
+    '''
+    files = []
+    for d in directories:
+        for entry in os.scandir(d):
+            if entry.name.endswith('.tmp'):
+                continue
+
+            st = entry.stat()
+            files.append((st.st_mtime, st.st_size, entry.path))
+
+    return files
+
+
+def _evict_lru(files, max_bytes):
+    ''' Remove the least recently used of files until they fit in max_bytes.
+    '''
+    total = sum(f[1] for f in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        total -= size
+
+
+class ParseCache(object):
+    ''' On-disk cache of parsed per sample results.
+
+    Entries are keyed on the sample path, the size and mtime of the files the
+    reader parses, and the reader arguments, so they are invalidated when any
+    of those change. Values are stored as raw NumPy arrays, and feature
+    indexes are stored once and shared between all samples which have the
+    same index. When the cache grows beyond max_bytes, the least recently
+    used files are removed by evict().
+
+    Example
+
+    >>> cache = ParseCache('.readquant_cache')
+    >>> tpm = read_quants('salmon/*_salmon_out', cache=cache)
+
+    '''
+    def __init__(self, directory='.readquant_cache', max_bytes=2 * 1024 ** 3):
+        '''
+
+        Parameters
+        ----------
+        directory, str, default '.readquant_cache'
+            Where to store the cache. Created if it does not exist.
+
+        max_bytes, int, default 2 GiB
+            Size limit for the cache, enforced by evict().
+
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entry_dir = os.path.join(directory, 'entries')
+        self._index_dir = os.path.join(directory, 'index')
+        self._indexes = {}
+
+        for d in (self._entry_dir, self._index_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_indexes'] = {}
+        return state
+
+    def key(self, reader, sample_path, files, kwargs):
+        ''' Cache key for parsing sample_path with reader.
+
+        Parameters
+        ----------
+        reader, callable
+            The sample parser.
+
+        sample_path, str
+            The sample being parsed.
+
+        files, list of str
+            The files reader parses for the sample.
+
+        kwargs, dict
+            Arguments passed to the reader.
+
+        '''
+        description = json.dumps([
+            CACHE_FORMAT_VERSION,
+            reader.__module__, reader.__name__,
+            os.path.abspath(sample_path),
+            [_file_identity(f) for f in files],
+            sorted((k, repr(v)) for k, v in kwargs.items())
+        ])
+
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self._entry_dir, key + '.npz')
+
+    def _index_path(self, key):
+        return os.path.join(self._index_dir, key + '.npy')
+
+    def _load_index(self, index_key, index_name):
+        # Samples sharing an index get the very same Index object, which
+        # makes assembling them cheap.
+        if (index_key, index_name) in self._indexes:
+            return self._indexes[index_key, index_name]
+
+        path = self._index_path(index_key)
+        names = np.load(path, allow_pickle=False).tobytes().decode('utf-8')
+        os.utime(path)
+        index = pd.Index(names.split('\n') if names else [], name=index_name)
+        self._indexes[index_key, index_name] = index
+
+        return index
+
+    def _store_index(self, index):
+        names = '\n'.join(index.astype(str)).encode('utf-8')
+        index_key = hashlib.sha1(names).hexdigest()
+        path = self._index_path(index_key)
+
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            _atomic_save(path, np.save, np.frombuffer(names, dtype=np.uint8))
+
+        return index_key
+
+    def get(self, key):
+        ''' Get a cached result.
+
+        Returns
+        -------
+        The cached pandas.Series or pandas.DataFrame, or None if key is not
+        in the cache.
+        '''
+        path = self._entry_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                values = entry['values']
+                meta = json.loads(str(entry['meta']))
+
+            index = self._load_index(meta['index_key'], meta['index_name'])
+            os.utime(path)
+
+        except (ValueError, KeyError, OSError):
+            return None
+
+        if 'columns' in meta:
+            return pd.DataFrame(values, index=index, columns=meta['columns'])
+
+        return pd.Series(values, index=index, name=meta['name'])
+
+    def put(self, key, result):
+        ''' Store a parsed result in the cache.
+
+        Parameters
+        ----------
+        key, str
+            The key from ParseCache.key().
+
+        result, pandas.Series or pandas.DataFrame
+            A per sample result with string labels. Results which can not
+            be stored as a numeric array are not cached.
+
+        '''
+        values = result.values
+        if values.dtype == object:
+            try:
+                values = values.astype(np.float64)
+            except (TypeError, ValueError):
+                return
+
+        meta = {
+            'index_key': self._store_index(result.index),
+            'index_name': result.index.name
+        }
+        if isinstance(result, pd.DataFrame):
+            meta['columns'] = [str(c) for c in result.columns]
+        else:
+            meta['name'] = result.name
+
+        _atomic_save(self._entry_path(key), _save_entry,
+                     {'values': values, 'meta': np.array(json.dumps(meta))})
+
+    def _files(self):
+        return _cache_files((self._entry_dir, self._index_dir))
+
+    def evict(self):
+        ''' Remove least recently used files until the cache is within
+        max_bytes.
+        '''
+        _evict_lru(self._files(), self.max_bytes)
+
+    def clear(self):
+        ''' Remove every file in the cache.
+        '''
+        for _, _, path in self._files():
+            os.remove(path)
+
+        self._indexes = {}
+
+
+class CachedReader(object):
+    ''' Wraps a per sample reader so results are taken from a ParseCache
+    when the sample has not changed.
+
+    Parameters
+    ----------
+    cache, ParseCache
+        The cache to use.
+
+    reader, callable
+        Per sample parser taking a sample path and keyword arguments.
+
+    files, callable
+        Function taking the same arguments as reader and returning the list
+        of files it parses for the sample.
+
+    **kwargs,
+        Arguments passed on to reader.
+
+    '''
+    def __init__(self, cache, reader, files, **kwargs):
+        self.cache = cache
+        self.reader = reader
+        self.files = files
+        self.kwargs = kwargs
+
+    def __call__(self, sample_path):
+        key = self.cache.key(self.reader, sample_path,
+                             self.files(sample_path, **self.kwargs), self.kwargs)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.reader(sample_path, **self.kwargs)
+            if result is not None:
+                self.cache.put(key, result)
+
+        return result
+
+
+class QueryCache(object):
+    ''' On-disk cache of BioMart query results.
+
+    Entries are keyed on the query XML, so identical queries share a result
+    regardless of which server answered them. Each result is stored
+    column by column as compressed NumPy arrays. Entries older than ttl
+    seconds are fetched again, and when the cache grows beyond max_bytes the
+    least recently used entries are removed. In offline mode results are
+    only ever taken from the cache, however old they are.
+
+    Example
+
+    >>> cache = QueryCache('.readquant_cache/biomart', offline=True)
+    >>> q = BioMartQuery('hsapiens_gene_ensembl', cache=cache)
+
+    '''
+    def __init__(self, directory='.readquant_cache/biomart', ttl=30 * 24 * 3600,
+                 max_bytes=512 * 1024 ** 2, offline=False):
+        '''
+
+        Parameters
+        ----------
+        directory, str, default '.readquant_cache/biomart'
+            Where to store the cache. Created if it does not exist.
+
+        ttl, float, default 30 days
+            Age in seconds after which entries are fetched again. None keeps
+            entries forever.
+
+        max_bytes, int, default 512 MiB
+            Size limit for the cache, enforced after every put().
+
+        offline, bool, default False
+            Only serve results from the cache, never make requests.
+
+        '''
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, query):
+        ''' Cache key for a query, from its XML serialisation.
+        '''
+        return hashlib.sha1(str(query).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, query):
+        ''' Get the cached result of a query.
+
+        Returns
+        -------
+        The cached pandas.DataFrame, or None if the query is not in the cache
+        or its entry has expired.
+        '''
+        path = self._entry_path(self.key(query))
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                meta = json.loads(str(entry['meta']))
+                if meta['query'] != str(query):
+                    return None
+
+                expired = self.ttl is not None and time.time() - meta['created'] > self.ttl
+                if expired and not self.offline:
+                    return None
+
+                columns = {}
+                for i, name in enumerate(meta['columns']):
+                    values = entry['c{}'.format(i)]
+                    if 'm{}'.format(i) in entry.files:
+                        values = pd.Series(values, dtype=object).mask(entry['m{}'.format(i)])
+
+                    columns[name] = values
+
+            os.utime(path)
+
+        except (ValueError, KeyError, OSError):
+            return None
+
+        return pd.DataFrame(columns, columns=meta['columns'])
+
+    def put(self, query, result):
+        ''' Store the result of a query in the cache.
+
+        Parameters
+        ----------
+        query, BioMartQuery or str
+            The query, or its XML.
+
+        result, pandas.DataFrame
+            The result of the query.
+
+        '''
+        arrays = {}
+        for i, name in enumerate(result.columns):
+            column = result[name]
+            values = column.values
+            if column.dtype == object:
+                # Labels are stored as fixed width strings, with a mask for
+                # missing values if there are any.
+                missing = column.isnull().values
+                if missing.any():
+                    arrays['m{}'.format(i)] = missing
+
+                values = np.asarray(column.fillna('').values, dtype=str)
+
+            arrays['c{}'.format(i)] = values
+
+        arrays['meta'] = np.array(json.dumps({
+            'query': str(query),
+            'columns': [str(c) for c in result.columns],
+            'created': time.time()
+        }))
+        _atomic_save(self._entry_path(self.key(query)), _save_compressed_entry, arrays)
+        self.evict()
+
+    def evict(self):
+        ''' Remove least recently used entries until the cache is within
+        max_bytes.
+        '''
+        _evict_lru(_cache_files((self.directory,)), self.max_bytes)
+
+    def clear(self):
+        ''' Remove every entry in the cache.
+        '''
+        for _, _, path in _cache_files((self.directory,)):
+            os.remove(path)
@@ -0,0 +1,390 @@
+''' The readquant command line interface.
+
+Only click is imported up front. Each command imports what it needs when it
+runs, so starting the program (e.g. for --help, or thousands of short jobs
+in an array) does not pay for pandas, numpy, pycurl or requests.
+'''
+import os
+import sys
+
+import click
+
+
+_manifest_option = click.option(
+    '--manifest', default=None,
+    help='JSON file listing the samples, made on the first run and refreshed instead of globbing after.')
+
+_float32_option = click.option(
+    '--float32', is_flag=True,
+    help='Store values in single precision when OUTPUT is .parquet, .feather, .arrow or .npz.')
+
+
+def _profile_option(command):
+    ''' Add --profile, and the options of what it measures, to a command.
+    '''
+    command = click.option(
+        '--read-probe', is_flag=True,
+        help='With --profile, read the files of every sample once before parsing, to time reading apart from parsing.')(command)
+    command = click.option(
+        '--profile-memory', is_flag=True,
+        help='With --profile, measure the peak memory of parsing each sample, which slows parsing down.')(command)
+    return click.option(
+        '--profile', is_flag=True,
+        help='Print the time spent finding, reading and parsing, and assembling samples, and the slowest samples.')(command)
+
+
+def _start_profile(profile, pattern, manifest, profile_memory=False, read_probe=False):
+    ''' Make a Profile if profiling, and replace pattern with an up to date
+    manifest if one is used.
+    '''
+    from .profile import Profile, profiler
+
+    profile = Profile(read_probe=read_probe, trace_memory=profile_memory) if profile else None
+    if manifest is not None:
+        from .manifest import discover
+
+        with profiler(profile).stage('discovery'):
+            pattern = discover(pattern, manifest)
+
+    return profile, pattern
+
+
+def _print_profile(profile):
+    if profile is not None:
+        click.echo(profile.report())
+
+
+def _write_output(table, output, float32=False):
+    ''' Write a table as CSV, or in the binary format of the output extension.
+    '''
+    from .formats import table_format, write_table
+
+    if table_format(output) is not None:
+        write_table(table, output, float32=float32)
+    else:
+        table.to_csv(output)
+
+
+# Units which are lengths, and are averaged rather than summed over the
+# transcripts of a gene.
+_LENGTH_UNITS = ('Length', 'EffectiveLength')
+
+
+def _layer_path(output, unit):
+    ''' Output path for one unit of a multi unit table, with the unit before
+    the extension, e.g. expression.TPM.csv.
+    '''
+    for extension in ('.mtx.gz',) + tuple('.' + e for e in ('csv', 'tsv', 'mtx', 'npz', 'parquet',
+                                                              'feather', 'arrow')):
+        if output.endswith(extension):
+            return output[:-len(extension)] + '.' + unit + extension
+
+    root, extension = os.path.splitext(output)
+    return root + '.' + unit + extension
+
+
+@click.group()
+def main():
+    ''' Gather expression tables and sample quality control data from
+    RNA-seq quantification results, and prepare references.
+    '''
+
+
+@main.command()
+@click.argument('pattern', default='salmon/*_salmon_out')
+@click.argument('output', default='expression.csv')
+@click.option('--version', default='0.7.2')
+@click.option('--unit', default=['NumReads'], multiple=True,
+              help='Unit to gather, can be given several times to read all of them in one pass. '
+                   'Each unit is then written to OUTPUT with the unit before the extension, '
+                   'or to a subdirectory of the --stream store.')
+@click.option('--isoforms', default=0)
+@click.option('--fast', is_flag=True, help='Parse transcript names only once for samples sharing an index.')
+@click.option('--n-jobs', default=1, help='Number of samples to parse concurrently, -1 for all cores.')
+@click.option('--executor', default='process', type=click.Choice(['process', 'thread']))
+@click.option('--sparse', is_flag=True,
+              help='Collect a sparse matrix and write it to OUTPUT as Matrix Market (.mtx, .mtx.gz) or .npz.')
+@click.option('--stream', is_flag=True,
+              help='Stream samples to an on-disk store directory at OUTPUT instead of building the matrix in memory.')
+@click.option('--cache', default=None, help='Directory of a cache of parsed samples to reuse between runs.')
+@click.option('--genemap', default=None,
+              help='Read transcripts and sum them to genes with this transcript to gene map, e.g. genemap.tsv. '
+                   'Length units are averaged over transcripts weighted by TPM instead.')
+@_float32_option
+@_manifest_option
+@_profile_option
+def expression(pattern='salmon/*_salmon_out', output='expression.csv', unit='NumReads', version=None,
+               isoforms=0, fast=False, n_jobs=1, executor='process', sparse=False, stream=False, cache=None,
+               genemap=None, float32=False, profile=False, manifest=None, profile_memory=False,
+               read_probe=False):
+    ''' Gather an expression table of the samples matching PATTERN.
+    '''
+    if sparse and stream:
+        raise click.BadParameter('--sparse and --stream can not be combined')
+
+    if genemap is not None and stream:
+        raise click.BadParameter('--genemap and --stream can not be combined')
+
+    if sparse and not output.endswith(('.mtx', '.mtx.gz', '.npz')):
+        raise click.BadParameter('sparse output must end with .mtx, .mtx.gz or .npz', param_hint='output')
+
+    from .parse import read_quants
+
+    if genemap is not None:
+        isoforms = 1
+
+    units = list(unit)
+    read_units = list(units)
+    if genemap is not None and 'TPM' not in units and any(u in _LENGTH_UNITS for u in units):
+        # Gene lengths are weighted by transcript abundance.
+        read_units.append('TPM')
+
+    if len(read_units) == 1:
+        unit = read_units[0]
+    else:
+        unit = read_units
+
+    profile, pattern = _start_profile(profile, pattern, manifest, profile_memory, read_probe)
+    if stream:
+        read_quants(pattern=pattern, version=version, unit=unit, isoforms=isoforms, fast=fast,
+                    n_jobs=n_jobs, executor=executor, cache=cache, store=output, profile=profile)
+        _print_profile(profile)
+        return
+
+    expr = read_quants(pattern=pattern, version=version, unit=unit, isoforms=isoforms, fast=fast,
+                       n_jobs=n_jobs, executor=executor, sparse=sparse, cache=cache, profile=profile)
+    if len(read_units) == 1:
+        expr = {read_units[0]: expr}
+
+    if genemap is not None:
+        from .genes import read_genemap, aggregate_genes, aggregate_lengths
+
+        genemap = read_genemap(genemap)
+
+    for layer_unit in units:
+        layer = expr[layer_unit]
+        layer_output = output if len(units) == 1 else _layer_path(output, layer_unit)
+        if genemap is not None and layer_unit in _LENGTH_UNITS:
+            layer = aggregate_lengths(layer, expr['TPM'], genemap)
+            if sparse:
+                import pandas as pd
+
+                layer = layer.astype(pd.SparseDtype('float64', 0))
+
+        elif genemap is not None:
+            layer = aggregate_genes(layer, genemap)
+
+        if sparse:
+            from .formats import write_sparse
+
+            write_sparse(layer, layer_output)
+        else:
+            _write_output(layer, layer_output, float32)
+
+    _print_profile(profile)
+
+
+@main.command('tech-qc')
+@click.argument('pattern', default='salmon/*_salmon_out')
+@click.argument('output', default='sample_qc.csv')
+@click.option('--version', default='0.7.2')
+@click.option('--n-jobs', default=1, help='Number of samples to read concurrently, -1 for all cores.')
+@click.option('--cache', default=None, help='Directory of a cache of parsed samples to reuse between runs.')
+@_float32_option
+@_manifest_option
+@_profile_option
+def tech_qc(pattern='salmon/*_salmon_out', output='sample_qc.csv', version=None, n_jobs=1,
+            cache=None, float32=False, profile=False, manifest=None, profile_memory=False,
+            read_probe=False):
+    ''' Gather technical QC values, like mapping rates and fragment length
+    modes, of the Salmon results matching PATTERN.
+    '''
+    from .parse import read_qcs
+
+    profile, pattern = _start_profile(profile, pattern, manifest, profile_memory, read_probe)
+    QCs = read_qcs(pattern=pattern, tool='salmon', version=version, n_jobs=n_jobs,
+                   cache=cache, profile=profile)
+    _write_output(QCs, output, float32)
+
+    _print_profile(profile)
+
+
+def get_ERCC():
+    from .data import ERCC
+
+    return ERCC()['concentration in Mix 1 (attomoles/ul)']
+
+
+def _ensembl_genes(base_url=None, cache=None, **filters):
+    import pandas as pd
+    from .utils import BioMartQuery
+
+    ENSEMBL = BioMartQuery("hsapiens_gene_ensembl", base_url=base_url, cache=cache)
+    ENSEMBL.add_filters(**filters)
+    ENSEMBL.add_attributes("ensembl_gene_id")
+
+    return pd.Index(ENSEMBL.stream()['ensembl_gene_id'])
+
+
+def get_MT(base_url=None, cache=None):
+    return _ensembl_genes(base_url, cache, chromosome_name="MT")
+
+
+def get_rRNA(base_url=None, cache=None):
+    return _ensembl_genes(base_url, cache, biotype="rRNA")
+
+
+@main.command('bio-qc')
+@click.argument('pattern', default='salmon/*_salmon_out')
+@click.argument('output', default='sample_bio_qc.csv')
+@click.option('--version', default='0.7.2')
+@click.option('--n-jobs', default=1, help='Number of samples to read concurrently, -1 for all cores.')
+@click.option('--biomart-url', default=None, help='BioMart service URL to query instead of Ensembl.')
+@click.option('--biomart-cache', default='.readquant_cache/biomart',
+              help='Directory of a cache of BioMart gene lists.')
+@click.option('--biomart-ttl', default=30., help='Days before cached gene lists are fetched again.')
+@click.option('--offline', is_flag=True, help='Only use cached gene lists, never query BioMart.')
+@_manifest_option
+@_profile_option
+def bio_qc(pattern='salmon/*_salmon_out', output='sample_bio_qc.csv', version=None, n_jobs=1,
+           biomart_url=None, biomart_cache='.readquant_cache/biomart', biomart_ttl=30., offline=False,
+           profile=False, manifest=None, profile_memory=False, read_probe=False):
+    ''' Gather biological QC values, like ERCC detection limits and
+    mitochondrial content, of the Salmon results matching PATTERN.
+    '''
+    from .cache import QueryCache
+    from .parse import read_quants
+    from .qc import bio_qc
+
+    cache = QueryCache(biomart_cache, ttl=biomart_ttl * 24 * 3600, offline=offline)
+
+    ercc = get_ERCC()
+    MT = get_MT(biomart_url, cache)
+    rRNA = get_rRNA(biomart_url, cache)
+
+    click.echo('Collected QC values')
+
+    profile, pattern = _start_profile(profile, pattern, manifest, profile_memory, read_probe)
+    quants = read_quants(pattern, tool='salmon', version=version, n_jobs=n_jobs, profile=profile)
+    QCs = bio_qc(quants, ercc_concentration=ercc, mt_genes=MT, rrna_genes=rRNA)
+
+    QCs.to_csv(output)
+
+    _print_profile(profile)
+
+
+@main.command('3p-bias')
+@click.argument('pattern', default='salmon/*_salmon_out/')
+@click.argument('output', default='sample_3p_bias.csv')
+@click.option('--length-scale', default=50., help='Smoothing length scale, in percent of transcript length.')
+@click.option('--n-out', default=100, help='Number of points along transcripts to report.')
+@click.option('--model', default=2, help='Which transcript length bin to use.')
+@click.option('--n-jobs', default=1, help='Number of files to read concurrently.')
+@_float32_option
+@_manifest_option
+@_profile_option
+def three_prime_bias(pattern='salmon/*_salmon_out/', output='sample_3p_bias.csv', length_scale=50.,
+                     n_out=100, model=2, n_jobs=1, float32=False, profile=False, manifest=None,
+                     profile_memory=False, read_probe=False):
+    ''' Gather the smoothed 3' positional bias of the Salmon results
+    matching PATTERN (ending in '/').
+    '''
+    from .parse import read_salmon_3p_bias
+
+    profile, pattern = _start_profile(profile, pattern, manifest, profile_memory, read_probe)
+    bias = read_salmon_3p_bias(pattern, length_scale=length_scale, n_out=n_out, model=model,
+                               n_jobs=n_jobs, profile=profile)
+    _write_output(bias, output, float32)
+
+    _print_profile(profile)
+
+
+@main.command()
+@click.argument('fq1')
+@click.argument('fq2')
+@click.argument('adapter')
+@click.option('--extra-adapter', multiple=True, help='Another adapter to count, can be given several times.')
+@click.option('--reverse-complement', is_flag=True, help='Also count reverse complements of adapters.')
+@click.option('--n-jobs', default=1, help='Number of processes scanning reads, -1 for all cores.')
+@click.option('--out1', default=None, help='Write first reads of pairs below the threshold here.')
+@click.option('--out2', default=None, help='Write second reads of pairs below the threshold here.')
+@click.option('--threshold', default=2, help='Pairs with at least this many adapter copies, over both reads, are not written.')
+@click.option('--compress-threads', default=4, help='Number of threads compressing output.')
+def concatamer(fq1, fq2, adapter, extra_adapter=(), reverse_complement=False, n_jobs=1,
+               out1=None, out2=None, threshold=2, compress_threads=4):
+    ''' Count adapter copies in read pairs, printing a histogram, and
+    optionally write the pairs with fewer than threshold copies to out1 and
+    out2 (gzipped if they end with gz) in the same pass.
+    '''
+    from .fastq import adapter_histogram, filter_concatamers
+
+    adapters = [adapter] + list(extra_adapter)
+    if out1 is not None:
+        if out2 is None:
+            raise click.UsageError('--out2 is needed with --out1')
+
+        df = filter_concatamers(fq1, fq2, out1, out2, adapters, threshold=threshold,
+                                reverse_complements=reverse_complement, n_jobs=n_jobs,
+                                compress_threads=compress_threads)
+    else:
+        df = adapter_histogram(fq1, fq2, adapters,
+                               reverse_complements=reverse_complement, n_jobs=n_jobs)
+
+    df.to_csv(sys.stdout)
+
+
+@main.command('fetch-reference')
+@click.argument('name', default='hsapiens_gene_ensembl')
+@click.option('--n-jobs', default=3, help='Number of files to download at the same time.')
+@click.option('--retries', default=5, help='How many times to retry a failed download.')
+@click.option('--biomart-url', default=None, help='BioMart service URL to query instead of Ensembl.')
+def fetch_reference(name='hsapiens_gene_ensembl', n_jobs=3, retries=5, biomart_url=None):
+    ''' Get files from Ensembl needed to make gene expression references.
+
+    Make a new folder with the data you ran the script for provenence, and run it there.
+
+    By defualt downloads the human reference files (hsapiens_gene_ensembl).
+    The name of the Ensembl database
+    is given as a an optional argument. For mouse, use mmusculus_gene_ensembl.
+
+    Files are downloaded at the same time, and a manifest of their sizes and
+    checksums is kept, so running the script again resumes partial downloads
+    and skips files which are already complete.
+    '''
+    from .download import fetch_reference
+
+    fetch_reference(name, n_jobs=n_jobs, retries=retries, base_url=biomart_url)
+
+
+@main.command('filter-gencode')
+@click.argument("gencode", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", default='-', required=False)
+@click.option('--biotype', multiple=True, help='Only keep transcripts of this biotype, can be given several times.')
+@click.option('--ids', type=click.File('r'), default=None, help='File with transcript IDs to keep, one per line.')
+@click.option('--exclude', default='_PAR_Y', help='Remove transcripts with headers matching this regular expression.')
+def filter_gencode(gencode, output, biotype=(), ids=None, exclude='_PAR_Y'):
+    """ in gencode, from release 25,
+    gene and trancript ids on the chrY PAR regions have "_PAR_Y" appended
+    this script simply remove those transcripts from the fasta file
+    there are 74 transcripts like that in gencode.v26.pc_transcripts.fa
+    usage: python filter_gencode.py gencode.v26.pc_transcripts.fa [filtered.fa]
+    if [filtered.fa] is absent, will output to stdout.
+
+    Input and output can be gzipped (ending with .gz). An index of the input
+    is written next to it on the first run, and transcripts can also be
+    selected by biotype or from a list of IDs.
+    """
+    from .fasta import filter_fasta, load_index, select_records
+
+    index = load_index(gencode)
+    keep = select_records(index, ids=[l.strip() for l in ids] if ids is not None else None,
+                          biotypes=list(biotype) or None)
+    if exclude:
+        keep &= select_records(index, pattern=exclude, exclude=True)
+
+    destination = sys.stdout.buffer if output == '-' else output
+    filter_fasta(gencode, destination, selected=keep, index=index)
+
+
+if __name__ == '__main__':
+    main()
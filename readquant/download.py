@@ -0,0 +1,214 @@
+from __future__ import print_function
+
+import os
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
+
+from .data import reference_templates
+from .store import _write_json
+from .utils import BioMartQuery
+
+
+MANIFEST = 'manifest.json'
+
+
+def _transfer_errors():
+    ''' Errors after which a transfer is retried. Requests errors are
+    IOErrors.
+    '''
+    try:
+        import pycurl
+    except ImportError:
+        return (IOError,)
+
+    return (IOError, pycurl.error)
+
+
+def reference_queries(name='hsapiens_gene_ensembl'):
+    ''' The BioMart queries for the files needed to make gene expression
+    references.
+
+    Parameters
+    ----------
+    name, str, default 'hsapiens_gene_ensembl'
+        The Ensembl dataset, e.g. 'mmusculus_gene_ensembl' for mouse.
+
+    Returns
+    -------
+    A dict from file name to query XML.
+    '''
+    tx_temp, ga_temp, gm_temp = reference_templates()
+
+    return {
+        'cDNA.fasta': tx_temp.replace('hsapiens_gene_ensembl', name),
+        'gene_annotation.csv': ga_temp.replace('hsapiens_gene_ensembl', name),
+        'genemap.tsv': gm_temp.replace('hsapiens_gene_ensembl', name)
+    }
+
+
+def _sha256(path, block_size=1024 ** 2):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _query_key(xml):
+    return hashlib.sha1(xml.encode('utf-8')).hexdigest()
+
+
+def read_manifest(directory):
+    ''' Read the manifest of downloaded files in directory.
+
+    Returns
+    -------
+    A dict from file name to a dict with its 'size', 'sha256' and the
+    'query' key it was downloaded with. Empty if there is no manifest.
+    '''
+    try:
+        with open(os.path.join(directory, MANIFEST)) as fh:
+            return json.load(fh)
+
+    except FileNotFoundError:
+        return {}
+
+
+def is_complete(directory, file_name, xml, manifest):
+    ''' Whether file_name in directory was completely downloaded with the
+    query xml, according to its size and checksum in the manifest.
+    '''
+    entry = manifest.get(file_name)
+    path = os.path.join(directory, file_name)
+    if entry is None or entry['query'] != _query_key(xml) or not os.path.exists(path):
+        return False
+
+    return os.path.getsize(path) == entry['size'] and _sha256(path) == entry['sha256']
+
+
+def download_query(query, path, retries=5, backoff=1.):
+    ''' Download the result of a query to path, resuming after failures.
+
+    Data is first written to path + '.part'. An existing partial file is
+    resumed from its end with a range request. If the server ignores the
+    range and sends the whole result, the partial file is truncated and
+    written again from the start. Failed transfers are retried, waiting backoff * 2 ** attempt seconds
+    between attempts, and resume where they stopped.
+
+    Parameters
+    ----------
+    query, BioMartQuery
+        The query to download.
+
+    path, str
+        The output file.
+
+    retries, int, default 5
+        How many times to retry a failed transfer.
+
+    backoff, float, default 1.
+        Seconds to wait before the first retry.
+
+    Returns
+    -------
+    The size of the downloaded file.
+    '''
+    part_path = path + '.part'
+    transfer_errors = _transfer_errors()
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            with open(part_path, 'ab') as fh:
+                for chunk in query.iter_content(start=offset, restart=lambda: fh.truncate(0)):
+                    fh.write(chunk)
+
+            break
+
+        except transfer_errors as e:
+            if attempt == retries:
+                raise
+
+            wait = backoff * 2 ** attempt
+            print('WARNING: Download of {} failed ({}), retrying in {:g} s'.format(path, e, wait))
+            time.sleep(wait)
+
+    os.replace(part_path, path)
+
+    return os.path.getsize(path)
+
+
+def fetch_reference(name='hsapiens_gene_ensembl', directory='.', n_jobs=3, retries=5,
+                    backoff=1., method='pycurl', base_url=None):
+    ''' Download the files from Ensembl needed to make gene expression
+    references: 'cDNA.fasta', 'gene_annotation.csv' and 'genemap.tsv'.
+
+    The files are downloaded concurrently, and the size and SHA-256 checksum
+    of every complete file is recorded in 'manifest.json', so when this is
+    run again files which are already complete are skipped, and partial
+    downloads are resumed. The query XML of each file is also written next
+    to it for provenance.
+
+    Parameters
+    ----------
+    name, str, default 'hsapiens_gene_ensembl'
+        The Ensembl dataset, e.g. 'mmusculus_gene_ensembl' for mouse.
+
+    directory, str, default '.'
+        Where to put the files.
+
+    n_jobs, int, default 3
+        Number of files to download at the same time.
+
+    retries, backoff,
+        See download_query.
+
+    method, base_url,
+        See BioMartQuery.
+
+    Returns
+    -------
+    The manifest, a dict from file name to its size and checksum.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    manifest_lock = threading.Lock()
+
+    def fetch(file_name, xml):
+        path = os.path.join(directory, file_name)
+        if is_complete(directory, file_name, xml, manifest):
+            print('{} is already complete'.format(file_name))
+            return
+
+        with open(os.path.splitext(path)[0] + '.query.xml', 'w') as fh:
+            fh.write(xml)
+
+        # A file from another query must not be resumed.
+        part_path = path + '.part'
+        entry = manifest.get(file_name)
+        if os.path.exists(part_path) and entry is not None and entry['query'] != _query_key(xml):
+            os.remove(part_path)
+
+        with manifest_lock:
+            manifest[file_name] = {'query': _query_key(xml), 'size': None, 'sha256': None}
+            _write_json(os.path.join(directory, MANIFEST), manifest)
+
+        query = BioMartQuery.from_xml(xml, method=method, base_url=base_url)
+        size = download_query(query, path, retries=retries, backoff=backoff)
+        checksum = _sha256(path)
+
+        with manifest_lock:
+            manifest[file_name] = {'query': _query_key(xml), 'size': size, 'sha256': checksum}
+            _write_json(os.path.join(directory, MANIFEST), manifest)
+
+        print('Downloaded {} ({} bytes)'.format(file_name, size))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(fetch, f, xml) for f, xml in reference_queries(name).items()]
+        for future in futures:
+            future.result()
+
+    return manifest
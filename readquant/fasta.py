@@ -0,0 +1,327 @@
+import os
+import re
+import gzip
+import mmap
+
+import numpy as np
+import pandas as pd
+
+
+INDEX_COLUMNS = ['name', 'length', 'offset', 'linebases', 'linewidth', 'start', 'end', 'header']
+
+_TRANSCRIPT_BIOTYPE = re.compile(r'transcript_biotype:(\S+)')
+
+
+def _open(path, mode='rb', compresslevel=6):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=compresslevel)
+
+    return open(path, mode)
+
+
+def _contents(path):
+    ''' The bytes of a FASTA file, memory mapped when it is not compressed.
+    '''
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as fh:
+            return fh.read()
+
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return b''
+
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def header_biotype(header):
+    ''' The transcript biotype in a GENCODE or Ensembl FASTA header, or None.
+
+    GENCODE headers have it as the eighth '|' separated field, Ensembl cDNA
+    headers as 'transcript_biotype:...'.
+    '''
+    match = _TRANSCRIPT_BIOTYPE.search(header)
+    if match:
+        return match.group(1)
+
+    fields = header.split('|')
+    if len(fields) >= 8:
+        return fields[7]
+
+    return None
+
+
+def build_index(path):
+    ''' Make an index of the records of a FASTA file.
+
+    The first five columns are those of a samtools .fai index: the name
+    (header up to the first whitespace), sequence length, byte offset of the
+    sequence, and bases and bytes per line. Additionally the byte range of
+    the whole record from 'start' to 'end', and the full 'header', are
+    kept. For gzipped files offsets are in the uncompressed data.
+
+    Parameters
+    ----------
+    path, str
+        The FASTA file, possibly gzipped.
+
+    Returns
+    -------
+    A pandas.DataFrame with a row for every record.
+    '''
+    data = _contents(path)
+    size = len(data)
+
+    rows = []
+    start = 0 if data[:1] == b'>' else data.find(b'\n>') + 1
+    while start >= 0 and size > 0 and data[start:start + 1] == b'>':
+        header_end = data.find(b'\n', start)
+        if header_end < 0:
+            header_end = size
+
+        offset = min(header_end + 1, size)
+        end = data.find(b'\n>', header_end)
+        end = size if end < 0 else end + 1
+
+        header = bytes(data[start + 1:header_end]).rstrip(b'\r').decode('utf-8')
+        first_line_end = data.find(b'\n', offset, end)
+        if first_line_end < 0:
+            first_line_end = end
+
+        linewidth = first_line_end - offset + 1
+        linebases = linewidth - 1 - (data[first_line_end - 1:first_line_end] == b'\r')
+
+        rows.append((header.split()[0] if header else '', 0, offset,
+                     linebases, linewidth, start, end, header))
+        start = end if end < size else -1
+
+    index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+
+    # Sequence lengths are the sizes of the records minus their line breaks,
+    # counted for all records at once.
+    offsets = index['offset'].values
+    ends = index['end'].values
+    length = ends - offsets
+    values = np.frombuffer(data, dtype=np.uint8) if size else np.zeros(0, dtype=np.uint8)
+    for line_break in (b'\n', b'\r'):
+        if data.find(line_break) < 0:
+            continue
+
+        breaks = np.concatenate([np.flatnonzero(values[i:i + 2 ** 26] == ord(line_break)) + i
+                                 for i in range(0, size, 2 ** 26)])
+        length -= np.searchsorted(breaks, ends) - np.searchsorted(breaks, offsets)
+
+    index['length'] = length
+
+    return index.set_index('name', drop=False)
+
+
+def _index_path(path):
+    # Not '.fai', so samtools and htslib indexes are never overwritten, and
+    # the offsets of gzipped files are not mistaken for a bgzip index.
+    return path + '.rqi'
+
+
+def write_index(index, path):
+    ''' Write a FASTA index next to the FASTA file at path, as path + '.rqi'.
+
+    The file is tab separated like a samtools .fai, with the extra columns
+    of build_index after the first five.
+    '''
+    index[INDEX_COLUMNS].to_csv(_index_path(path), sep='\t', header=False, index=False)
+
+
+def load_index(path):
+    ''' Load the index of a FASTA file, building and writing it first if it
+    does not exist or is older than the file. If the index can not be
+    written, e.g. next to a reference in a read only directory, the built
+    index is used without saving it.
+
+    Returns
+    -------
+    A pandas.DataFrame as from build_index.
+    '''
+    index_path = _index_path(path)
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+        index = pd.read_csv(index_path, sep='\t', header=None, names=INDEX_COLUMNS,
+                            dtype={'name': str, 'header': str}, keep_default_na=False,
+                            quoting=3)
+        if len(index.columns) == len(INDEX_COLUMNS) and not index['end'].isnull().any():
+            return index.set_index('name', drop=False)
+
+    index = build_index(path)
+    try:
+        write_index(index, path)
+
+    except OSError as e:
+        print("WARNING: Could not write the index of {} ({}), it will be built again next time".format(path, e))
+
+    return index
+
+
+def fetch(path, name, index=None):
+    ''' Get the sequence of a single record.
+
+    Only the record is read from uncompressed files. Gzipped files have to
+    be decompressed up to the record.
+
+    Parameters
+    ----------
+    path, str
+        The FASTA file, possibly gzipped.
+
+    name, str
+        The name of the record, as in the index.
+
+    index, pandas.DataFrame, default None
+        The index of the file, loaded with load_index if not given.
+
+    Returns
+    -------
+    The sequence as a str.
+    '''
+    if index is None:
+        index = load_index(path)
+
+    record = index.loc[name]
+    with _open(path) as fh:
+        fh.seek(record['offset'])
+        data = fh.read(record['end'] - record['offset'])
+
+    return data.replace(b'\n', b'').replace(b'\r', b'').decode('ascii')
+
+
+def select_records(index, ids=None, pattern=None, biotypes=None, exclude=False):
+    ''' Select records of a FASTA index.
+
+    Parameters
+    ----------
+    index, pandas.DataFrame
+        From load_index.
+
+    ids, list-like, default None
+        Record IDs to select. A record matches on its name, or the first '|'
+        separated field of it (e.g. the transcript of a GENCODE header).
+
+    pattern, str, default None
+        Regular expression searched for in headers.
+
+    biotypes, list-like, default None
+        Transcript biotypes to select, see header_biotype.
+
+    exclude, bool, default False
+        Select the records which do not match instead.
+
+    Returns
+    -------
+    A boolean numpy.ndarray with a value for every record.
+    '''
+    selected = np.ones(len(index), dtype=bool)
+    if ids is not None:
+        ids = pd.Index(ids)
+        selected &= index['name'].isin(ids).values \
+            | index['name'].str.split('|').str[0].isin(ids).values
+
+    if pattern is not None:
+        selected &= index['header'].str.contains(pattern, regex=True).values
+
+    if biotypes is not None:
+        selected &= index['header'].map(header_biotype).isin(biotypes).values
+
+    if exclude:
+        selected = ~selected
+
+    return selected
+
+
+def _runs(starts, ends):
+    ''' Merge adjacent byte ranges.
+    '''
+    runs = []
+    for start, end in zip(starts, ends):
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    return runs
+
+
+def _copy_range(src, dst, start, end, chunk_size=1024 ** 2):
+    ''' Copy bytes start to end of src to dst, returning the last chunk.
+    '''
+    src.seek(start)
+    remaining = end - start
+    chunk = b''
+    while remaining > 0:
+        chunk = src.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+    return chunk
+
+
+def filter_fasta(path, output, ids=None, pattern=None, biotypes=None, exclude=False,
+                 selected=None, index=None, compresslevel=6):
+    ''' Write the records of a FASTA file which match filters to a new file.
+
+    Whole records are copied as byte ranges, with consecutive records merged
+    into single copies, rather than line by line.
+
+    Parameters
+    ----------
+    path, str
+        The FASTA file, possibly gzipped.
+
+    output, str or binary file object
+        Where to write the selected records, gzipped if it ends with '.gz'.
+
+    ids, pattern, biotypes, exclude,
+        The filters, see select_records.
+
+    selected, numpy.ndarray, default None
+        Boolean array of the records of the index to write, used instead of
+        the filters, e.g. to combine several calls to select_records.
+
+    index, pandas.DataFrame, default None
+        The index of the file, loaded with load_index if not given.
+
+    compresslevel, int, default 6
+        Compression level for gzipped output.
+
+    Returns
+    -------
+    The number of records written.
+    '''
+    if index is None:
+        index = load_index(path)
+
+    if selected is None:
+        selected = select_records(index, ids=ids, pattern=pattern, biotypes=biotypes,
+                                  exclude=exclude)
+
+    records = index[selected].sort_values('start')
+    runs = _runs(records['start'].values, records['end'].values)
+
+    if isinstance(output, str):
+        dst = _open(output, 'wb', compresslevel=compresslevel)
+    else:
+        dst = output
+
+    try:
+        last = b''
+        with _open(path) as src:
+            for start, end in runs:
+                last = _copy_range(src, dst, start, end) or last
+
+        # The last record of a file might not end with a newline.
+        if last and not last.endswith(b'\n'):
+            dst.write(b'\n')
+
+    finally:
+        if isinstance(output, str):
+            dst.close()
+
+    return len(records)
@@ -0,0 +1,134 @@
+import gzip
+import threading
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+
+# The layout, name column and pandas.Index of the last table read. Samples
+# from one run share the same transcript names, so after the first file the
+# cached Index is reused instead of building a new one. Only one is kept, so
+# the names of earlier runs do not stay in memory.
+_last_index = None
+_last_index_lock = threading.Lock()
+
+
+def _split_header(data, header, comment):
+    ''' Split data into header fields and the body of the table.
+    '''
+    start = 0
+    if comment is not None:
+        comment = comment.encode()
+        while data.startswith(comment, start):
+            start = data.index(b'\n', start) + 1
+
+    if not header:
+        return None, data[start:]
+
+    end = data.index(b'\n', start)
+    fields = data[start:end].rstrip(b'\r').decode('utf-8').split('\t')
+
+    return fields, data[end + 1:]
+
+
+def _shared_index(layout, names, index_name):
+    ''' Get an index of names, reusing the index from the previous table if
+    it had the same layout and the names are identical.
+    '''
+    global _last_index
+
+    cached = _last_index
+    if cached is not None and cached[0] == layout and cached[1] == names:
+        return cached[2]
+
+    index = pd.Index([name.decode('utf-8') for name in names], name=index_name)
+    with _last_index_lock:
+        _last_index = (layout, names, index)
+
+    return index
+
+
+def read_shared_index_table(quant_file, value_column, index_name='Name',
+                            header=True, names=None, comment=None, data=None):
+    ''' Read a tab separated table where the first column holds feature names
+    shared between samples, e.g. a Salmon quant.sf or Kallisto abundance.tsv.
+
+    The table is split into fields with a single bytes split, and only the
+    requested numeric columns are converted. The names are compared byte for
+    byte with the names of the previous file, and if it has the same layout
+    and they match the pandas.Index built for it is reused rather than
+    decoding and hashing every name again. Tables which do not split into
+    whole rows are parsed with pandas instead.
+
+    Parameters
+    ----------
+    quant_file, str
+        Path to the table. Files ending in '.gz' are decompressed.
+
+    value_column, str or list of str
+        The column with the values to return, or several columns.
+
+    index_name, str, default 'Name'
+        Name of the returned index.
+
+    header, bool, default True
+        Whether the first line of the file has the column names.
+
+    names, list of str, default None
+        Column names for files without a header.
+
+    comment, str, default None
+        Leading lines starting with this are skipped.
+
+    data, bytes, default None
+        Contents of quant_file, e.g. read from an archive, to parse instead
+        of reading the file.
+
+    Returns
+    -------
+    A pandas.Series with the values indexed by feature name, or a
+    pandas.DataFrame with the columns if value_column is a list.
+    '''
+    value_columns = [value_column] if isinstance(value_column, str) else list(value_column)
+
+    if data is None:
+        with open(quant_file, 'rb') as fh:
+            data = fh.read()
+
+    if quant_file.endswith('.gz'):
+        data = gzip.decompress(data)
+
+    fields, body = _split_header(data, header, comment)
+    if fields is None:
+        fields = names
+
+    n_fields = len(fields)
+    value_positions = [fields.index(c) for c in value_columns]
+
+    cells = body.replace(b'\n', b'\t').split(b'\t')
+    if cells[-1] == b'':
+        cells.pop()
+
+    try:
+        n_rows = len(cells) // n_fields
+        if len(cells) % n_fields != 0 or body.rstrip(b'\n').count(b'\n') != n_rows - 1:
+            raise ValueError('Ragged table')
+
+        values = [np.array(cells[p::n_fields], dtype=np.float64) for p in value_positions]
+
+    except ValueError:
+        dtype = dict([(fields[0], str)] + [(c, np.float64) for c in value_columns])
+        df = pd.read_csv(BytesIO(body), sep='\t', header=None, names=fields,
+                         engine='c', usecols=[fields[0]] + value_columns, index_col=0,
+                         dtype=dtype)
+        df.index.name = index_name
+        return df[value_column]
+
+    layout = (quant_file.rsplit('/', 1)[-1], tuple(fields), index_name)
+    index = _shared_index(layout, cells[0::n_fields], index_name)
+
+    if isinstance(value_column, str):
+        return pd.Series(values[0], index=index, name=value_column)
+
+    return pd.DataFrame(dict(zip(value_columns, values)), index=index, columns=value_columns)
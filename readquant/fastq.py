@@ -0,0 +1,448 @@
+import re
+import gzip
+import zlib
+import queue
+import threading
+import concurrent.futures
+from collections import deque
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .parse import _make_executor
+
+
+_COMPLEMENT = bytes.maketrans(b'ACGTNacgtn', b'TGCANtgcan')
+
+
+def reverse_complement(seq):
+    ''' Reverse complement of a DNA sequence.
+    '''
+    return seq.encode().translate(_COMPLEMENT)[::-1].decode()
+
+
+def adapter_pattern(adapters, reverse_complements=False):
+    ''' Compile a pattern matching any of several adapters.
+
+    All adapters are matched in a single scan of the sequence, like with an
+    Aho-Corasick automaton. Like str.count, matches do not overlap.
+
+    Parameters
+    ----------
+    adapters, str or list of str
+        Adapter sequences.
+
+    reverse_complements, bool, default False
+        Also match the reverse complement of every adapter.
+
+    Returns
+    -------
+    A compiled bytes regular expression.
+    '''
+    if isinstance(adapters, str):
+        adapters = [adapters]
+
+    sequences = [a.upper() for a in adapters]
+    if reverse_complements:
+        sequences += [reverse_complement(a) for a in sequences]
+
+    # Longest first, so an adapter contained in another does not shadow it.
+    sequences = sorted(set(sequences), key=lambda s: (-len(s), s))
+
+    return re.compile('|'.join(re.escape(s) for s in sequences).encode())
+
+
+def open_fastq(path, mode='rb'):
+    ''' Open a FASTQ file in binary mode, gzipped if path ends with 'gz'.
+    '''
+    if path.endswith('gz'):
+        return gzip.open(path, mode)
+
+    return open(path, mode)
+
+
+def record_blocks(path, block_size=4 * 1024 ** 2):
+    ''' Read a FASTQ file in blocks of whole records.
+
+    Parameters
+    ----------
+    path, str
+        FASTQ file, possibly gzipped.
+
+    block_size, int, default 4 MiB
+        Number of bytes to read at a time. Blocks are cut after the last
+        complete record, and the rest is carried over to the next block.
+
+    Yields
+    ------
+    bytes with a whole number of four line records.
+    '''
+    rest = b''
+    with open_fastq(path) as fh:
+        while True:
+            data = fh.read(block_size)
+            if not data:
+                break
+
+            block = rest + data
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            n_lines = len(newlines) // 4 * 4
+            if n_lines == 0:
+                rest = block
+                continue
+
+            cut = newlines[n_lines - 1] + 1
+            rest = block[cut:]
+            yield block[:cut]
+
+    if rest.strip():
+        if not rest.endswith(b'\n'):
+            rest += b'\n'
+
+        if rest.count(b'\n') % 4 != 0:
+            raise ValueError('Truncated FASTQ record at the end of {}'.format(path))
+
+        yield rest
+
+
+def count_adapters(block, pattern):
+    ''' Count adapter matches in the sequence line of every record in a
+    block of whole FASTQ records.
+
+    Parameters
+    ----------
+    block, bytes
+        FASTQ records.
+
+    pattern, compiled bytes regular expression
+        From adapter_pattern.
+
+    Returns
+    -------
+    A numpy.ndarray with the number of matches of each record.
+    '''
+    sequences = block.split(b'\n')[1::4]
+
+    # Sequences are scanned joined together, and matches are assigned to
+    # records by their position. Adapters can not span the newlines.
+    joined = b'\n'.join(sequences)
+    ends = np.cumsum([len(s) + 1 for s in sequences])
+    starts = [m.start() for m in pattern.finditer(joined)]
+    records = np.searchsorted(ends, starts, side='right')
+
+    return np.bincount(records, minlength=len(sequences))
+
+
+def _count_blocks(blocks, pattern):
+    ''' Adapter copies in every read pair of blocks with the same records.
+    '''
+    return sum(count_adapters(block, pattern) for block in blocks)
+
+
+def _map_blocks(func, blocks, n_jobs=1, executor='process'):
+    ''' Apply func to every block, in a pool of workers when n_jobs is not 1,
+    keeping a bounded number of blocks in flight.
+
+    Yields
+    ------
+    Results in the same order as blocks.
+    '''
+    if n_jobs == 1:
+        for block in blocks:
+            yield func(block)
+
+        return
+
+    with _make_executor(n_jobs, executor) as pool:
+        max_pending = 2 * pool._max_workers
+        pending = deque()
+        for block in blocks:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+            pending.append(pool.submit(func, block))
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def adapter_histogram(fq1, fq2=None, adapters=(), reverse_complements=False, n_jobs=1,
+                      executor='process', block_size=4 * 1024 ** 2):
+    ''' Histogram of the number of adapter copies in read pairs, to find
+    concatamers.
+
+    The FASTQ files are read in large binary blocks with the same reads
+    from each file, and only sequence lines are searched, for all adapters
+    at once. Blocks are read in a background thread and scanned in worker
+    processes.
+
+    Parameters
+    ----------
+    fq1, str
+        FASTQ file of first reads, possibly gzipped.
+
+    fq2, str, default None
+        FASTQ file of second reads for paired-end data.
+
+    adapters, str or list of str
+        Adapter sequences to count.
+
+    reverse_complements, bool, default False
+        Also count reverse complements of the adapters.
+
+    n_jobs, int, default 1
+        Number of workers scanning blocks. -1 uses all available cores.
+
+    executor, str, default 'process'
+        Whether to scan blocks in a 'process' or 'thread' pool.
+
+    block_size, int, default 4 MiB
+        Number of bytes of FASTQ per block.
+
+    Returns
+    -------
+    A pandas.DataFrame with the number of 'Fragments' for every number of
+    'Copies' of adapters which occurs.
+    '''
+    pattern = adapter_pattern(adapters, reverse_complements)
+    paths = [fq1] if fq2 is None else [fq1, fq2]
+
+    counter = partial(_count_blocks, pattern=pattern)
+    blocks = _prefetch(paired_record_blocks(paths, block_size))
+    hist = np.zeros(1, dtype=np.int64)
+    for copies in _map_blocks(counter, blocks, n_jobs=n_jobs, executor=executor):
+        counts = np.bincount(copies)
+        hist = np.pad(hist, (0, max(0, len(counts) - len(hist))))
+        hist[:len(counts)] += counts
+
+    observed = np.flatnonzero(hist)
+    df = pd.DataFrame({'Fragments': hist[observed]},
+                      index=pd.Index(observed, name='Copies'))
+
+    return df
+
+
+def _split_records(block, n):
+    ''' Split a block of whole FASTQ records after the first n records.
+    '''
+    if n == 0:
+        return b'', block
+
+    newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+    cut = newlines[4 * n - 1] + 1
+
+    return block[:cut], block[cut:]
+
+
+def paired_record_blocks(paths, block_size=4 * 1024 ** 2):
+    ''' Read several FASTQ files of the same reads, e.g. first and second
+    reads, in blocks with the same records.
+
+    Yields
+    ------
+    Tuples with a block of whole records from each file, where the blocks
+    have the same number of records.
+    '''
+    readers = [record_blocks(p, block_size) for p in paths]
+    buffers = [b''] * len(paths)
+    n_records = [0] * len(paths)
+    exhausted = [False] * len(paths)
+    while True:
+        # Read more of the file which is furthest behind, so buffers stay
+        # within about a block of each other.
+        behind = [i for i in range(len(paths)) if not exhausted[i]]
+        if not behind:
+            break
+
+        i = min(behind, key=lambda i: n_records[i])
+        block = next(readers[i], None)
+        if block is None:
+            exhausted[i] = True
+        else:
+            buffers[i] += block
+            n_records[i] += block.count(b'\n') // 4
+
+        n = min(n_records)
+        if n > 0:
+            heads = []
+            for j in range(len(paths)):
+                head, buffers[j] = _split_records(buffers[j], n)
+                n_records[j] -= n
+                heads.append(head)
+
+            yield tuple(heads)
+
+        elif any(exhausted[j] and n_records[j] == 0 for j in range(len(paths))):
+            break
+
+    # A file which ran out first leaves the others with reads beyond their
+    # buffers, which would otherwise be silently dropped.
+    for j in range(len(paths)):
+        if not exhausted[j] and next(readers[j], None) is not None:
+            n_records[j] += 1
+
+    if any(n_records):
+        raise ValueError('{} have different numbers of reads'.format(' and '.join(paths)))
+
+
+def _select_records(block, keep):
+    ''' The records of a block of FASTQ records where keep is True.
+    '''
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n'))[3::4] + 1
+    lengths = np.diff(ends, prepend=0)
+
+    return data[np.repeat(keep, lengths)].tobytes()
+
+
+def _filter_blocks(blocks, pattern, threshold):
+    copies = sum(count_adapters(block, pattern) for block in blocks)
+    keep = copies < threshold
+
+    return copies, [_select_records(block, keep) for block in blocks]
+
+
+def _prefetch(iterable, maxsize=4):
+    ''' Iterate over iterable in a background thread, keeping at most
+    maxsize items ready.
+    '''
+    items = queue.Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+
+                if stop.is_set():
+                    return
+
+            items.put((done, None))
+
+        except BaseException as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+
+            if item is done:
+                break
+
+            yield item
+
+    finally:
+        stop.set()
+
+
+def _gzip_member(data, compresslevel):
+    ''' Compress data to a complete gzip member. Concatenated members make a
+    valid gzip file.
+    '''
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def filter_concatamers(fq1, fq2, out1, out2, adapters, threshold=2, reverse_complements=False,
+                       n_jobs=1, executor='process', compress_threads=4, compresslevel=1,
+                       block_size=4 * 1024 ** 2):
+    ''' Write read pairs with fewer than threshold adapter copies to new
+    FASTQ files, and count adapter copies in every pair.
+
+    Work is done in a pipeline: a thread decompresses and reads blocks of
+    records, workers count adapters and select the pairs to keep, and a
+    pool of threads compresses the selected records of each block to a
+    separate gzip member, which are written out in order. Every stage has a
+    bounded number of blocks in flight, so memory use does not depend on
+    the size of the files.
+
+    Parameters
+    ----------
+    fq1, fq2, str
+        FASTQ files of first and second reads, possibly gzipped. fq2 can be
+        None for single-end reads.
+
+    out1, out2, str
+        Output FASTQ files for the kept reads, gzipped if they end with
+        'gz'. out2 is ignored for single-end reads.
+
+    adapters, str or list of str
+        Adapter sequences to count.
+
+    threshold, int, default 2
+        Pairs with at least this many adapter copies, counted over both
+        reads, are removed. The default removes concatamers while keeping
+        pairs with a single adapter copy, e.g. from read-through; 1 removes
+        every pair with an adapter.
+
+    compress_threads, int, default 4
+        Number of threads compressing output.
+
+    compresslevel, int, default 1
+        gzip compression level of the output. Higher levels compress
+        sequence data only a little better but are many times slower.
+
+    Other parameters are as for adapter_histogram.
+
+    Returns
+    -------
+    A pandas.DataFrame with the number of 'Fragments' for every number of
+    'Copies' of adapters which occurs, in all read pairs.
+    '''
+    pattern = adapter_pattern(adapters, reverse_complements)
+    paths = [fq1] if fq2 is None else [fq1, fq2]
+    outputs = [open(out, 'wb') for out in [out1, out2][:len(paths)]]
+    compress = [out.name.endswith('gz') for out in outputs]
+
+    hist = np.zeros(1, dtype=np.int64)
+    matcher = partial(_filter_blocks, pattern=pattern, threshold=threshold)
+    blocks = _prefetch(paired_record_blocks(paths, block_size))
+    compressed = deque()
+
+    def write_oldest():
+        for out, member in zip(outputs, compressed.popleft()):
+            out.write(member.result())
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=compress_threads) as pool:
+            for copies, kept in _map_blocks(matcher, blocks, n_jobs=n_jobs, executor=executor):
+                counts = np.bincount(copies)
+                hist = np.pad(hist, (0, max(0, len(counts) - len(hist))))
+                hist[:len(counts)] += counts
+
+                if len(compressed) >= 2 * compress_threads:
+                    write_oldest()
+
+                members = []
+                for data, gz in zip(kept, compress):
+                    if gz:
+                        members.append(pool.submit(_gzip_member, data, compresslevel))
+                    else:
+                        members.append(concurrent.futures.Future())
+                        members[-1].set_result(data)
+
+                compressed.append(members)
+
+            while compressed:
+                write_oldest()
+
+    finally:
+        for out in outputs:
+            out.close()
+
+    observed = np.flatnonzero(hist)
+    df = pd.DataFrame({'Fragments': hist[observed]},
+                      index=pd.Index(observed, name='Copies'))
+
+    return df
@@ -0,0 +1,302 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _npz_format(path):
+    ''' The 'format' marker of an npz file: 'csc' for sparse matrices from
+    write_sparse, 'readquant-table' for tables from write_table.
+    '''
+    with np.load(path, allow_pickle=False) as npz:
+        if 'format' not in npz.files:
+            raise ValueError('{} is not a readquant npz file'.format(path))
+
+        fmt = npz['format']
+
+    return fmt.tobytes().decode() if fmt.dtype.kind == 'S' else str(fmt)
+
+
+def _sparse_label_paths(path):
+    base = path
+    for ext in ('.gz', '.mtx'):
+        if base.endswith(ext):
+            base = base[:-len(ext)]
+
+    return base + '.genes.tsv', base + '.samples.tsv'
+
+
+def write_sparse(quants, path):
+    ''' Write a sparse expression table without densifying it.
+
+    Parameters
+    ----------
+    quants, pandas.DataFrame
+        A sparse backed DataFrame, e.g. from read_quants(sparse=True).
+
+    path, str
+        Output file. If it ends with '.npz' the matrix and its labels are
+        stored in one file which scipy.sparse.load_npz can also read.
+        Otherwise Matrix Market format is written (gzipped if path ends with
+        '.gz'), with row and column labels in '.genes.tsv' and '.samples.tsv'
+        files next to it.
+
+    '''
+    matrix = quants.sparse.to_coo().tocsc()
+    rows = np.asarray(quants.index, dtype=str)
+    columns = np.asarray(quants.columns, dtype=str)
+
+    if path.endswith('.npz'):
+        np.savez(path, format=b'csc', shape=matrix.shape, data=matrix.data,
+                 indices=matrix.indices, indptr=matrix.indptr,
+                 rows=rows, columns=columns)
+        return
+
+    from scipy import io
+
+    open_file = gzip.open if path.endswith('.gz') else open
+    with open_file(path, 'wb') as fh:
+        io.mmwrite(fh, matrix)
+
+    genes_path, samples_path = _sparse_label_paths(path)
+    pd.Series(rows).to_csv(genes_path, index=False, header=False)
+    pd.Series(columns).to_csv(samples_path, index=False, header=False)
+
+
+def read_sparse(path):
+    ''' Read a sparse expression table written by write_sparse.
+
+    Parameters
+    ----------
+    path, str
+        The '.npz' or Matrix Market file. A dense '.npz' table from
+        write_table is also read, and made sparse.
+
+    Returns
+    -------
+    A pandas.DataFrame with sparse columns, where columns are samples and
+    rows are genes.
+    '''
+    from scipy import sparse
+
+    if path.endswith('.npz') and _npz_format(path) == 'readquant-table':
+        table = read_table(path)
+        return table.astype(pd.SparseDtype(np.float64, 0))
+
+    if path.endswith('.npz'):
+        with np.load(path, allow_pickle=False) as npz:
+            matrix = sparse.csc_matrix((npz['data'], npz['indices'], npz['indptr']),
+                                       shape=tuple(npz['shape']))
+            rows = npz['rows']
+            columns = npz['columns']
+
+    else:
+        from scipy import io
+
+        open_file = gzip.open if path.endswith('.gz') else open
+        with open_file(path, 'rb') as fh:
+            matrix = io.mmread(fh).tocsc()
+
+        genes_path, samples_path = _sparse_label_paths(path)
+        rows = pd.read_csv(genes_path, header=None, dtype=str)[0].values
+        columns = pd.read_csv(samples_path, header=None, dtype=str)[0].values
+
+    return pd.DataFrame.sparse.from_spmatrix(matrix, index=pd.Index(rows),
+                                             columns=pd.Index(columns))
+
+
+TABLE_FORMATS = {
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.npz': 'npz'
+}
+
+
+def table_format(path):
+    ''' The binary table format for a file name, or None if it has none.
+    '''
+    for ext, fmt in TABLE_FORMATS.items():
+        if path.endswith(ext):
+            return fmt
+
+    return None
+
+
+def _as_float32(table):
+    floats = table.select_dtypes(include=[np.float64]).columns
+    return table.astype({c: np.float32 for c in floats})
+
+
+def _arrow_table(table, label_name):
+    ''' Convert a DataFrame to a pyarrow.Table with the index as a dictionary
+    encoded label column.
+    '''
+    import pyarrow as pa
+
+    labels = pa.array(np.asarray(table.index, dtype=str)).dictionary_encode()
+    arrays = [labels] + [pa.array(table[c].values) for c in table.columns]
+    names = [label_name] + [str(c) for c in table.columns]
+    metadata = {b'readquant': json.dumps({'index_name': table.index.name,
+                                          'label_column': label_name}).encode()}
+
+    return pa.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+
+def write_table(table, path, float32=False, chunk_size=65536, n_threads=None, compression=None):
+    ''' Write an expression or QC table to a binary columnar file.
+
+    Parquet and Feather files need pyarrow. Rows are labelled by a dictionary
+    encoded first column, columns are written as typed arrays in chunks of
+    chunk_size rows (Parquet row groups or Feather record batches), and
+    Arrow compresses columns on n_threads threads. '.npz' files hold the
+    values as compressed NumPy arrays with the labels next to them, as one
+    matrix when all columns have the same type and column by column
+    otherwise. They are marked as tables, so read_table and read_sparse can
+    tell them from the sparse '.npz' files of write_sparse.
+
+    Parameters
+    ----------
+    table, pandas.DataFrame
+        E.g. a genes x samples matrix from read_quants, or a QC table from
+        read_qcs. Sparse tables are written densely.
+
+    path, str
+        Output file, ending with '.parquet', '.feather', '.arrow' or '.npz'.
+
+    float32, bool, default False
+        Store floating point values in single precision, halving the size.
+
+    chunk_size, int, default 65536
+        Number of rows per chunk.
+
+    n_threads, int, default None
+        Number of threads Arrow uses for this write, by default the number
+        of cores.
+
+    compression, str, default None
+        Arrow compression codec, by default 'zstd' for Parquet and 'lz4'
+        for Feather.
+
+    '''
+    fmt = table_format(path)
+    if fmt is None:
+        raise ValueError('Unknown table format: {}'.format(path))
+
+    if hasattr(table, 'sparse') and all(isinstance(t, pd.SparseDtype) for t in table.dtypes):
+        table = table.sparse.to_dense()
+
+    if float32:
+        table = _as_float32(table)
+
+    if fmt == 'npz':
+        if any(t == object for t in table.dtypes):
+            raise ValueError('Only numeric tables can be written as npz')
+
+        # Tables of one type are stored as a single matrix, others column by
+        # column so every column keeps its type.
+        if len(set(table.dtypes)) <= 1:
+            arrays = {'values': table.values}
+        else:
+            arrays = {'c{}'.format(i): table[c].values for i, c in enumerate(table.columns)}
+
+        np.savez_compressed(path, format=np.array('readquant-table'),
+                            rows=np.asarray(table.index, dtype=str),
+                            columns=np.asarray(table.columns, dtype=str),
+                            index_name=np.array(json.dumps(table.index.name)), **arrays)
+        return
+
+    import pyarrow as pa
+
+    # The Arrow thread pool is global, so it is put back as it was after
+    # writing.
+    previous_threads = pa.cpu_count()
+    if n_threads is not None:
+        pa.set_cpu_count(n_threads)
+
+    try:
+        arrow_table = _arrow_table(table, table.index.name or 'index')
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+
+            pq.write_table(arrow_table, path, row_group_size=chunk_size,
+                           compression=compression or 'zstd')
+        else:
+            from pyarrow import feather
+
+            feather.write_feather(arrow_table, path, chunksize=chunk_size,
+                                  compression=compression or 'lz4')
+
+    finally:
+        if n_threads is not None:
+            pa.set_cpu_count(previous_threads)
+
+
+def read_table(path, columns=None):
+    ''' Read a table written by write_table.
+
+    Parameters
+    ----------
+    path, str
+        The '.parquet', '.feather', '.arrow' or '.npz' file. A sparse '.npz'
+        from write_sparse is also read, as a sparse table.
+
+    columns, list of str, default None
+        Only read these columns (e.g. samples), which for Arrow formats
+        avoids reading the others from disk at all.
+
+    Returns
+    -------
+    A pandas.DataFrame like the one which was written.
+    '''
+    fmt = table_format(path)
+    if fmt is None:
+        raise ValueError('Unknown table format: {}'.format(path))
+
+    if fmt == 'npz' and _npz_format(path) == 'csc':
+        table = read_sparse(path)
+        return table if columns is None else table[columns]
+
+    if fmt == 'npz':
+        with np.load(path, allow_pickle=False) as npz:
+            index = pd.Index(npz['rows'], name=json.loads(str(npz['index_name'])))
+            if 'values' in npz.files:
+                table = pd.DataFrame(npz['values'], index=index,
+                                     columns=pd.Index(npz['columns']), copy=False)
+            else:
+                table = pd.DataFrame({c: npz['c{}'.format(i)] for i, c in enumerate(npz['columns'])},
+                                     index=index)
+
+        if columns is not None:
+            table = table[columns]
+
+        return table
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(path)
+        wanted = None if columns is None else [_label_column(schema)] + list(columns)
+        arrow_table = pq.read_table(path, columns=wanted)
+    else:
+        from pyarrow import feather
+
+        # Feather files are memory mapped, so unselected columns are never
+        # read.
+        arrow_table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            arrow_table = arrow_table.select([_label_column(arrow_table.schema)] + list(columns))
+
+    meta = json.loads(arrow_table.schema.metadata[b'readquant'])
+    labels = arrow_table.column(meta['label_column'])
+    index = pd.Index(labels.to_pandas().astype(str), name=meta['index_name'])
+
+    table = arrow_table.drop([meta['label_column']]).to_pandas()
+    table.index = index
+
+    return table
+
+
+def _label_column(schema):
+    return json.loads(schema.metadata[b'readquant'])['label_column']
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+
+def read_genemap(path='genemap.tsv'):
+    ''' Read a transcript to gene map, like the genemap.tsv made by
+    fetch_reference.py.
+
+    Parameters
+    ----------
+    path, str, default 'genemap.tsv'
+        Tab separated file without header, with transcript IDs in the first
+        column and gene IDs in the second.
+
+    Returns
+    -------
+    A pandas.Series of gene IDs indexed by transcript ID.
+    '''
+    genemap = pd.read_csv(path, sep='\t', header=None, usecols=[0, 1],
+                          names=['ensembl_transcript_id', 'ensembl_gene_id'],
+                          dtype=str, index_col=0)['ensembl_gene_id']
+
+    return genemap[~genemap.index.duplicated()]
+
+
+def _strip_version(ids):
+    ''' Remove GENCODE style '|' separated annotations and '.N' versions
+    from IDs.
+    '''
+    return pd.Index(ids).str.split('|').str[0].str.replace(r'\.\d+$', '', regex=True)
+
+
+def gene_indicator(transcripts, genemap, strip_versions=True):
+    ''' Compile a transcript to gene map into a sparse genes x transcripts
+    indicator matrix for a given transcript index.
+
+    Parameters
+    ----------
+    transcripts, pandas.Index
+        The transcripts, e.g. the index of read_quants(isoforms=True).
+
+    genemap, pandas.Series
+        Gene IDs indexed by transcript ID, from read_genemap.
+
+    strip_versions, bool, default True
+        Match transcripts without '.N' versions and GENCODE '|' annotations.
+
+    Returns
+    -------
+    indicator, scipy.sparse.csr_matrix
+        Genes x transcripts matrix with a 1 where a transcript belongs to a
+        gene.
+
+    genes, pandas.Index
+        The gene of each row of the indicator.
+    '''
+    from scipy import sparse
+
+    keys = pd.Index(transcripts)
+    map_keys = genemap.index
+    if strip_versions:
+        keys = _strip_version(keys)
+        map_keys = _strip_version(map_keys)
+
+    positions = pd.Index(map_keys).get_indexer(keys)
+    mapped = positions >= 0
+    if not mapped.all():
+        print('WARNING: Dropping {} transcripts which are not in the gene map'
+              .format((~mapped).sum()))
+
+    gene_codes, genes = pd.factorize(genemap.values[positions[mapped]], sort=True)
+    indicator = sparse.csr_matrix(
+        (np.ones(mapped.sum()), (gene_codes, np.flatnonzero(mapped))),
+        shape=(len(genes), len(keys)))
+
+    return indicator, pd.Index(genes, name='ensembl_gene_id')
+
+
+def _values(quants):
+    try:
+        return quants.sparse.to_coo().tocsr()
+    except AttributeError:
+        return np.nan_to_num(np.asarray(quants.values, dtype=np.float64))
+
+
+def _product(indicator, values):
+    ''' The product of the indicator and values, sparse if values is.
+    '''
+    product = indicator.dot(values)
+    if isinstance(product, np.ndarray):
+        return product
+
+    return product.tocsc()
+
+
+def _dense(values):
+    if isinstance(values, np.ndarray):
+        return values
+
+    return values.toarray()
+
+
+def _gene_lengths(indicator, tpm, lengths, gene_tpm):
+    ''' Abundance weighted average length of every gene in every sample, or
+    the plain average for genes without expression.
+    '''
+    weighted = _product(indicator, tpm * lengths)
+    n_transcripts = np.asarray(indicator.sum(axis=1)).ravel()[:, None]
+    plain = _product(indicator, lengths) / np.maximum(n_transcripts, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(gene_tpm > 0, weighted / gene_tpm, plain)
+
+
+def aggregate_lengths(lengths, tpm, genemap, strip_versions=True):
+    ''' Collapse transcript lengths to gene lengths, averaged over the
+    transcripts of each gene weighted by their abundance, like the average
+    transcript lengths of tximport.
+
+    Parameters
+    ----------
+    lengths, pandas.DataFrame
+        Transcripts x samples matrix of lengths, e.g. from
+        read_quants(isoforms=True, unit='EffectiveLength'). May be sparse.
+
+    tpm, pandas.DataFrame
+        Transcript TPM of the same samples, the weights.
+
+    genemap, pandas.Series or str
+        Gene IDs indexed by transcript ID, or the path of a genemap.tsv.
+
+    strip_versions, bool, default True
+        See gene_indicator.
+
+    Returns
+    -------
+    A pandas.DataFrame where rows are genes and columns are samples.
+    '''
+    if isinstance(genemap, str):
+        genemap = read_genemap(genemap)
+
+    indicator, genes = gene_indicator(lengths.index, genemap, strip_versions)
+    tpm = _dense(_values(tpm.reindex(index=lengths.index, columns=lengths.columns)))
+    gene_tpm = _product(indicator, tpm)
+    gene_lengths = _gene_lengths(indicator, tpm, _dense(_values(lengths)), gene_tpm)
+
+    return pd.DataFrame(gene_lengths, index=genes, columns=lengths.columns)
+
+
+def aggregate_genes(quants, genemap, method='sum', counts=None, lengths=None,
+                    strip_versions=True):
+    ''' Collapse a transcripts x samples matrix to genes with one sparse
+    matrix product.
+
+    Parameters
+    ----------
+    quants, pandas.DataFrame
+        Matrix where rows are transcripts and columns are samples, e.g. from
+        read_quants(isoforms=True). May be sparse. With the length aware
+        methods this must be TPM.
+
+    genemap, pandas.Series or str
+        Gene IDs indexed by transcript ID, or the path of a genemap.tsv.
+
+    method, str, default 'sum'
+        'sum' adds up quants of the transcripts of each gene. 'scaledTPM'
+        and 'lengthScaledTPM' make gene level counts from TPM like
+        tximport's countsFromAbundance: gene TPM, for 'lengthScaledTPM'
+        multiplied by the average abundance weighted length of the gene
+        over samples, scaled to the library size of each sample in counts.
+        To aggregate lengths themselves use aggregate_lengths.
+
+    counts, pandas.DataFrame, default None
+        Transcript read counts (e.g. unit='NumReads'), for the length aware
+        methods.
+
+    lengths, pandas.DataFrame or pandas.Series, default None
+        Transcript (effective) lengths, per sample or shared by all samples,
+        for 'lengthScaledTPM'.
+
+    strip_versions, bool, default True
+        See gene_indicator.
+
+    Returns
+    -------
+    A pandas.DataFrame where rows are genes and columns are samples. For
+    sparse quants it is sparse too, except with method 'lengthScaledTPM'.
+    '''
+    if isinstance(genemap, str):
+        genemap = read_genemap(genemap)
+
+    indicator, genes = gene_indicator(quants.index, genemap, strip_versions)
+    tpm = _values(quants)
+    gene_values = _product(indicator, tpm)
+
+    if method == 'sum':
+        pass
+
+    elif method in ('scaledTPM', 'lengthScaledTPM'):
+        if counts is None:
+            raise ValueError('counts are needed for method {}'.format(method))
+
+        if method == 'lengthScaledTPM':
+            if lengths is None:
+                raise ValueError('lengths are needed for method lengthScaledTPM')
+
+            if isinstance(lengths, pd.Series):
+                lengths = np.repeat(lengths.reindex(quants.index).values[:, None],
+                                    quants.shape[1], axis=1)
+            else:
+                lengths = lengths.reindex(index=quants.index, columns=quants.columns).values
+
+            lengths = np.nan_to_num(lengths)
+            tpm = _dense(tpm)
+            gene_values = _dense(gene_values)
+
+            gene_lengths = _gene_lengths(indicator, tpm, lengths, gene_values)
+            gene_values = gene_values * gene_lengths.mean(axis=1)[:, None]
+
+        counts = counts.reindex(index=quants.index, columns=quants.columns)
+        library_sizes = np.asarray(_product(indicator, _values(counts)).sum(axis=0)).ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = library_sizes / np.asarray(gene_values.sum(axis=0)).ravel()
+
+        if isinstance(gene_values, np.ndarray):
+            gene_values = gene_values * scale
+        else:
+            from scipy import sparse
+
+            gene_values = (gene_values @ sparse.diags(scale)).tocsc()
+
+    else:
+        raise ValueError('Unknown method: {}'.format(method))
+
+    if not isinstance(gene_values, np.ndarray):
+        return pd.DataFrame.sparse.from_spmatrix(gene_values, index=genes, columns=quants.columns)
+
+    return pd.DataFrame(gene_values, index=genes, columns=quants.columns)
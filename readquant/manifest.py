@@ -0,0 +1,333 @@
+import os
+import json
+import glob
+import fnmatch
+import concurrent.futures
+
+from .store import _write_json
+
+
+MANIFEST_FORMAT_VERSION = 1
+
+
+def _split_pattern(pattern):
+    ''' Split a glob pattern into the directory before the first wildcard
+    and the remaining path components.
+    '''
+    trailing_slash = pattern.endswith('/')
+    parts = [p for p in pattern.split('/') if p]
+    root_parts = []
+    while parts and not glob.has_magic(parts[0]):
+        root_parts.append(parts.pop(0))
+
+    root = '/'.join(root_parts)
+    if pattern.startswith('/'):
+        root = '/' + root
+
+    return root, parts, trailing_slash
+
+
+def _join(directory, name):
+    if not directory:
+        return name
+
+    return directory.rstrip('/') + '/' + name
+
+
+def _list_matches(directory, component, directories_only):
+    ''' Entries of directory matching one glob component, as
+    (path, is_dir, stat_result) tuples.
+    '''
+    matches = []
+    try:
+        with os.scandir(directory or '.') as entries:
+            for entry in entries:
+                # Like glob, wildcards do not match hidden names.
+                if entry.name.startswith('.') and not component.startswith('.'):
+                    continue
+
+                if not fnmatch.fnmatchcase(entry.name, component):
+                    continue
+
+                is_dir = entry.is_dir()
+                if directories_only and not is_dir:
+                    continue
+
+                matches.append((_join(directory, entry.name), is_dir, entry.stat()))
+
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+
+    return matches
+
+
+def _scan_directory(path, max_depth):
+    ''' Sizes and mtimes of all files under a directory, and mtimes of its
+    subdirectories, in one os.scandir pass per directory.
+    '''
+    files = {}
+    directories = {}
+    stack = [('', max_depth)]
+    while stack:
+        relative, depth = stack.pop()
+        try:
+            with os.scandir(_join(path, relative)) as entries:
+                for entry in entries:
+                    name = _join(relative, entry.name)
+                    st = entry.stat()
+                    if entry.is_dir():
+                        directories[name] = st.st_mtime_ns
+                        if depth > 1:
+                            stack.append((name, depth - 1))
+                    else:
+                        files[name] = [st.st_size, st.st_mtime_ns]
+
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    return files, directories
+
+
+class SampleManifest(object):
+    ''' The samples matching a glob pattern and the files in them, found in
+    a single os.scandir sweep instead of one glob and many stat calls per
+    read.
+
+    On network filesystems the metadata operations of finding samples and
+    checking files can take longer than parsing. A manifest is made once
+    with scan(), saved, and later refreshed incrementally, and can be
+    passed to read_quants, read_qcs and read_salmon_3p_bias in place of a
+    glob pattern.
+
+    Attributes
+    ----------
+    pattern, str
+        The glob pattern of the samples.
+
+    samples, dict
+        Maps each sample path to a dict from file paths relative to the
+        sample to [size, mtime_ns]. A sample matching a file rather than a
+        directory has the single relative path ''.
+
+    directories, dict
+        Maps each sample path to its mtime_ns and those of its
+        subdirectories, which refresh() uses to find changed samples.
+
+    '''
+    def __init__(self, pattern, samples=None, directories=None, max_depth=2):
+        self.pattern = pattern
+        self.samples = samples if samples is not None else {}
+        self.directories = directories if directories is not None else {}
+        self.max_depth = max_depth
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def __repr__(self):
+        return "SampleManifest('{}', {} samples)".format(self.pattern, len(self))
+
+    @classmethod
+    def scan(cls, pattern, n_threads=8, max_depth=2):
+        ''' Find the samples matching pattern and the files in them.
+
+        Parameters
+        ----------
+        pattern, str
+            Glob pattern of the samples, e.g. 'salmon/*_salmon_out'.
+
+        n_threads, int, default 8
+            Number of directories to scan at the same time. On network
+            filesystems metadata requests are mostly waiting, so this can be
+            larger than the number of cores.
+
+        max_depth, int, default 2
+            How deep to look for files in sample directories. 2 includes
+            files in subdirectories like 'aux_info/meta_info.json'.
+
+        Returns
+        -------
+        A SampleManifest.
+        '''
+        manifest = cls(pattern, max_depth=max_depth)
+        manifest.refresh(n_threads=n_threads)
+
+        return manifest
+
+    def _match(self, pool):
+        ''' The paths matching the pattern with their stat results, listing
+        directories one level of the pattern at a time.
+        '''
+        root, components, trailing_slash = _split_pattern(self.pattern)
+        if not components:
+            try:
+                st = os.stat(root)
+            except FileNotFoundError:
+                return []
+
+            return [(self.pattern, os.path.isdir(root), st)]
+
+        directories = [root]
+        matches = []
+        for level, component in enumerate(components):
+            last = level == len(components) - 1
+            listed = pool.map(_list_matches, directories, [component] * len(directories),
+                              [trailing_slash or not last] * len(directories))
+            matches = [m for level_matches in listed for m in level_matches]
+            directories = [path for path, _, _ in matches]
+
+        if trailing_slash:
+            matches = [(path + '/', is_dir, st) for path, is_dir, st in matches]
+
+        return sorted(matches)
+
+    def _unchanged(self, sample_path, st):
+        ''' Whether a sample is in the manifest and neither it nor its
+        subdirectories have changed since.
+        '''
+        directories = self.directories.get(sample_path)
+        if sample_path not in self.samples or directories is None:
+            return False
+
+        if directories.get('') != st.st_mtime_ns:
+            return False
+
+        for relative, mtime_ns in directories.items():
+            if not relative:
+                continue
+
+            try:
+                if os.stat(_join(sample_path, relative)).st_mtime_ns != mtime_ns:
+                    return False
+
+            except FileNotFoundError:
+                return False
+
+        return True
+
+    def _scan_sample(self, match):
+        sample_path, is_dir, st = match
+        if self._unchanged(sample_path, st):
+            return False, self.samples[sample_path], self.directories[sample_path]
+
+        if not is_dir:
+            return True, {'': [st.st_size, st.st_mtime_ns]}, {'': st.st_mtime_ns}
+
+        files, directories = _scan_directory(sample_path, self.max_depth)
+        directories[''] = st.st_mtime_ns
+
+        return True, files, directories
+
+    def refresh(self, n_threads=8):
+        ''' Update the manifest with samples which were added, removed or
+        changed since it was made.
+
+        Directories matching the pattern are listed again, but samples
+        whose directory and subdirectories have the same mtimes as before
+        are not scanned again. Files rewritten in place, which does not
+        change the mtime of their directory, are only noticed by scan().
+
+        Parameters
+        ----------
+        n_threads, int, default 8
+            See scan().
+
+        Returns
+        -------
+        The list of sample paths which were new or changed.
+        '''
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_threads, 1)) as pool:
+            matches = self._match(pool)
+            scanned = list(pool.map(self._scan_sample, matches))
+
+        samples = {}
+        directories = {}
+        changed = []
+        for (sample_path, _, _), (is_changed, files, sample_directories) in zip(matches, scanned):
+            samples[sample_path] = files
+            directories[sample_path] = sample_directories
+            if is_changed:
+                changed.append(sample_path)
+
+        self.samples = samples
+        self.directories = directories
+
+        return changed
+
+    def sample_paths(self, required=None):
+        ''' The samples in the manifest.
+
+        Parameters
+        ----------
+        required, str, default None
+            Only return samples which have this file, relative to the
+            sample, e.g. 'aux_info/obs3_pos.gz'.
+
+        '''
+        if required is None:
+            return list(self.samples)
+
+        return [s for s, files in self.samples.items() if required in files]
+
+    def files(self, sample_path):
+        ''' Full paths of the files of a sample.
+        '''
+        return [_join(sample_path, f) if f else sample_path for f in self.samples[sample_path]]
+
+    def save(self, path):
+        ''' Write the manifest to a JSON file.
+        '''
+        _write_json(path, {'format': MANIFEST_FORMAT_VERSION, 'pattern': self.pattern,
+                           'max_depth': self.max_depth, 'samples': self.samples,
+                           'directories': self.directories})
+
+    @classmethod
+    def load(cls, path):
+        ''' Read a manifest written by save().
+        '''
+        with open(path) as fh:
+            data = json.load(fh)
+
+        if data.get('format') != MANIFEST_FORMAT_VERSION:
+            raise ValueError('Unsupported manifest format in {}'.format(path))
+
+        return cls(data['pattern'], data['samples'], data['directories'], data['max_depth'])
+
+
+def discover(pattern, path=None, n_threads=8, max_depth=2):
+    ''' Get an up to date SampleManifest of pattern, reusing the one saved at
+    path when it is for the same pattern.
+
+    Parameters
+    ----------
+    pattern, str
+        Glob pattern of the samples.
+
+    path, str, default None
+        JSON file to load the manifest from and save it to. If None the
+        samples are scanned without saving.
+
+    n_threads, max_depth,
+        See SampleManifest.scan.
+
+    Returns
+    -------
+    A SampleManifest.
+    '''
+    manifest = None
+    if path is not None and os.path.exists(path):
+        manifest = SampleManifest.load(path)
+        if manifest.pattern != pattern or manifest.max_depth != max_depth:
+            manifest = None
+
+    if manifest is None:
+        manifest = SampleManifest.scan(pattern, n_threads=n_threads, max_depth=max_depth)
+    else:
+        manifest.refresh(n_threads=n_threads)
+
+    if path is not None:
+        manifest.save(path)
+
+    return manifest
@@ -1,19 +1,47 @@
 from __future__ import print_function
 from glob import iglob
+from functools import partial
+from collections import deque
+from io import BytesIO
+import concurrent.futures
 
 import os
+import re
+import json
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-def read_kallisto(sample_path):
+from .assemble import DenseAssembler, SparseAssembler, LayeredAssembler
+from .cache import ParseCache, CachedReader
+from .store import StoreWriter
+from .fastparse import read_shared_index_table
+from .profile import profiler
+from .manifest import SampleManifest
+from .archive import split_archive_pattern, iter_archive_samples
+
+def _kallisto_files(sample_path, fast=False):
+    return [sample_path + '/abundance.tsv']
+
+
+def read_kallisto(sample_path, fast=False):
     ''' Function for reading a Kallisto quantification result.
 
+    Parameters
+    ----------
+    fast : bool, default False
+        Whether to use readquant.fastparse, which only parses the transcript
+        names once when reading many samples with the same index.
+
     Returns
     -------
     A pandas.Series with the expression values in the sample.
     '''
     quant_file = sample_path + '/abundance.tsv'
+    if fast:
+        quant = read_shared_index_table(quant_file, 'tpm', index_name='target_id')
+        return quant.rename('TPM')
+
     df = pd.read_table(quant_file, engine='c',
                                    usecols=['target_id', 'tpm'],
                                    index_col=0,
@@ -23,8 +51,21 @@ def read_kallisto(sample_path):
     return df['TPM']
 
 
-def read_salmon(sample_path, isoforms=False, version='0.7.2', unit='TPM'):
-    ''' Function for reading a Salmon quantification result.
+def _salmon_members(isoforms=False, version='0.7.2', unit='TPM', fast=False):
+    if isoforms:
+        return ['quant.sf']
+    else:
+        return ['quant.genes.sf']
+
+
+def _salmon_files(sample_path, isoforms=False, version='0.7.2', unit='TPM', fast=False):
+    quant_file = sample_path + '/' + _salmon_members(isoforms)[0]
+    return [quant_file, quant_file + '.gz']
+
+
+def read_salmon(sample_path, isoforms=False, version='0.7.2', unit='TPM', fast=False):
+    ''' Function for reading a Salmon quantification result. A gzip
+    compressed quant.sf.gz is read if the uncompressed file is missing.
 
     Parameters
     ----------
@@ -36,47 +77,97 @@ def read_salmon(sample_path, isoforms=False, version='0.7.2', unit='TPM'):
         supports '0.7.2', '0.6.0' and '0.4.0'. (Other versions might be compatible
         with these.)
 
+    unit : str or list of str, default 'TPM'
+        The column of the quantification file to read, e.g. 'TPM' or
+        'NumReads'. A list of columns, e.g. ['TPM', 'NumReads',
+        'EffectiveLength'], are all read in one pass over the file.
+
+    fast : bool, default False
+        Whether to use readquant.fastparse, which only parses the transcript
+        names once when reading many samples with the same index.
+
     Returns
     -------
-    A pandas.Series with the expression values in the sample.
+    A pandas.Series with the expression values in the sample, or a
+    pandas.DataFrame with a column for every unit if unit is a list.
     '''
-    if isoforms:
-        quant_file = sample_path + '/quant.sf'
-    else:
-        quant_file = sample_path + '/quant.genes.sf'
+    quant_file = _salmon_files(sample_path, isoforms)[0]
+
+    # Opening the file directly rather than checking for it first saves a
+    # metadata request per sample on network filesystems.
+    for path in (quant_file, quant_file + '.gz'):
+        try:
+            return _parse_salmon_quant(path, version=version, unit=unit, fast=fast)
+        except FileNotFoundError:
+            pass
+
+    print("WARNING: Could not find file: %s" % quant_file)
+
+
+def _parse_salmon_members(sample_path, files, isoforms=False, version='0.7.2', unit='TPM',
+                          fast=False):
+    ''' Parse a Salmon quantification result from the contents of its files,
+    as read by readquant.archive.iter_archive_samples.
+    '''
+    relative = _salmon_members(isoforms)[0]
+    if relative not in files:
+        print("WARNING: Could not find file: %s/%s" % (sample_path, relative))
+        return
+
+    return _parse_salmon_quant(sample_path + '/' + relative, data=files[relative],
+                               version=version, unit=unit, fast=fast)
+
+
+def _parse_salmon_quant(quant_file, data=None, version='0.7.2', unit='TPM', fast=False):
+    ''' Parse a Salmon quant.sf or quant.genes.sf, from data if given and
+    otherwise from quant_file. See read_salmon.
+    '''
+    units = [unit] if isinstance(unit, str) else list(unit)
+    dtype = dict([('Name', np.str)] + [(u, np.float64) for u in units])
 
     read_kwargs = {
         '0.7.2': {
             'engine': 'c',
-            'usecols': ['Name', unit],
+            'usecols': ['Name'] + units,
             'index_col': 0,
-            'dtype': {'Name': np.str, unit: np.float64}
+            'dtype': dtype
         },
         '0.6.0': {
             'engine': 'c',
-            'usecols': ['Name', unit],
+            'usecols': ['Name'] + units,
             'index_col': 0,
-            'dtype': {'Name': np.str, unit: np.float64}
+            'dtype': dtype
         },
         '0.4.0': {
             'engine': 'c',
             'comment': '#',
             'header': None,
             'names': ['Name', 'length', 'TPM', 'NumReads'],
-            'usecols': ['Name', 'TPM'],
+            'usecols': ['Name'] + units,
             'index_col': 0,
-            'dtype': {'Name': np.str, 'TPM': np.float64}
+            'dtype': dtype
         }
     }
 
-    if not os.path.isfile(quant_file):
-        print("WARNING: Could not find file: %s" % quant_file)
-        return
-    else:
-        df = pd.read_table(quant_file, **read_kwargs[version])
+    if fast and version == '0.4.0':
+        return read_shared_index_table(quant_file, unit, header=False, comment='#',
+                                       names=read_kwargs[version]['names'], data=data)
+    elif fast:
+        return read_shared_index_table(quant_file, unit, data=data)
+
+    compression = 'gzip' if quant_file.endswith('.gz') else None
+    df = pd.read_table(quant_file if data is None else BytesIO(data), compression=compression,
+                       **read_kwargs[version])
 
-        df = df.rename(columns={'Name': 'target_id'})
-        return df[unit]
+    df = df.rename(columns={'Name': 'target_id'})
+    return df[unit] if isinstance(unit, str) else df[units]
+
+
+def _cufflinks_files(sample_path, isoforms=False):
+    if isoforms:
+        return [sample_path + '/isoforms.fpkm_tracking']
+    else:
+        return [sample_path + '/genes.fpkm_tracking']
 
 
 def read_cufflinks(sample_path, isoforms=False):
@@ -95,24 +186,239 @@ def read_cufflinks(sample_path, isoforms=False):
                                    index_col=0,
                                    dtype={'tracking_id': np.str, 'FPKM': np.float64})
 
-    df['tracking_id'] = df.index
-    df = df.groupby('tracking_id').sum()
+    df = df.groupby(level='tracking_id').sum()
     df['TPM'] = df['FPKM'] / df['FPKM'].sum() * 1e6
 
     df = df.rename(columns={'tracking_id': 'target_id'})
     return df['TPM']
 
 
-def read_quants(pattern='salmon/*_salmon_out', tool='salmon', **kwargs):
+def _make_executor(n_jobs, executor):
+    ''' Create a concurrent.futures executor with n_jobs workers.
+    '''
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+
+    if executor == 'process':
+        return concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs)
+    elif executor == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs)
+    else:
+        raise ValueError('Unknown executor: {}'.format(executor))
+
+
+def _pop_finished(pending, progress):
+    sample_path, future = pending.popleft()
+    result = future.result()
+    progress.update()
+    return sample_path, result
+
+
+def _map_samples(func, sample_paths, n_jobs=1, executor='process'):
+    ''' Apply func to every sample path, possibly in parallel.
+
+    Results are yielded in the same order as sample_paths regardless of
+    which worker finishes first, and progress is reported with tqdm.
+
+    Parameters
+    ----------
+    func, callable
+        Function taking a sample path. Must be picklable (e.g. a module level
+        function or a functools.partial of one) when using processes.
+
+    sample_paths, iterable of str
+        The samples to process.
+
+    n_jobs, int, default 1
+        Number of workers. 1 means parse in the calling process, -1 means
+        use all available cores.
+
+    executor, str or concurrent.futures.Executor, default 'process'
+        Either 'process', 'thread', or an existing Executor instance to
+        submit work to.
+
+    Yields
+    ------
+    Tuples (sample_path, result) in input order.
+    '''
+    sample_paths = list(sample_paths)
+    progress = tqdm(total=len(sample_paths))
+
+    if n_jobs == 1 and not isinstance(executor, concurrent.futures.Executor):
+        for sample_path in sample_paths:
+            result = func(sample_path)
+            progress.update()
+            yield sample_path, result
+
+        progress.close()
+        return
+
+    if isinstance(executor, concurrent.futures.Executor):
+        pool = executor
+        owns_pool = False
+    else:
+        pool = _make_executor(n_jobs, executor)
+        owns_pool = True
+
+    # Keep a bounded window of samples in flight, so results which are
+    # waiting to be consumed in order do not pile up in memory.
+    max_pending = 4 * (getattr(pool, '_max_workers', None) or os.cpu_count() or 1)
+    pending = deque()
+    try:
+        for sample_path in sample_paths:
+            if len(pending) >= max_pending:
+                yield _pop_finished(pending, progress)
+
+            pending.append((sample_path, pool.submit(func, sample_path)))
+
+        while pending:
+            yield _pop_finished(pending, progress)
+
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+        if owns_pool:
+            pool.shutdown()
+
+        progress.close()
+
+
+def _map_archive_samples(parse, archive, pattern, members, profile):
+    ''' Apply parse to the samples in a tar archive while it is streamed.
+
+    The archive is decompressed in a background thread, see
+    readquant.archive.iter_archive_samples, while samples are parsed here.
+    Time spent waiting for samples to be read counts as the 'read' stage.
+
+    Parameters
+    ----------
+    parse, callable
+        Function taking a sample path and a dict from members to their
+        contents.
+
+    archive, pattern, members,
+        See readquant.archive.iter_archive_samples.
+
+    profile, readquant.profile.Profile
+        Where to record the read and parse times.
+
+    Yields
+    ------
+    Tuples (sample_path, result) in archive order.
+    '''
+    samples = iter_archive_samples(archive, members, pattern)
+    progress = tqdm()
+    try:
+        while True:
+            with profile.stage('read'):
+                sample = next(samples, None)
+
+            if sample is None:
+                break
+
+            sample_path, files = sample
+            with profile.stage('parse'):
+                result = parse(sample_path, files)
+
+            progress.update()
+            yield sample_path, result
+
+    finally:
+        samples.close()
+        progress.close()
+
+
+def _split_archive(pattern):
+    ''' The archive and member pattern of a pattern inside a tar archive,
+    or (None, pattern).
+    '''
+    if isinstance(pattern, SampleManifest):
+        return None, pattern
+
+    return split_archive_pattern(pattern)
+
+
+def _find_samples(pattern):
+    ''' The sample paths matching a glob pattern, or those of a
+    SampleManifest.
+    '''
+    if isinstance(pattern, SampleManifest):
+        return pattern.sample_paths()
+
+    return list(iglob(pattern))
+
+
+def _find_sample_files(pattern, relative):
+    ''' Pairs of sample path and file for the samples which have the file
+    relative, from a glob pattern of samples ending in '/' or a
+    SampleManifest.
+    '''
+    if isinstance(pattern, SampleManifest):
+        return [(s, os.path.join(s, relative)) for s in pattern.sample_paths(required=relative)]
+
+    return [(f[:-len(relative)], f) for f in iglob(pattern + relative)]
+
+
+def _sample_reader(reader, files, cache, kwargs):
+    ''' Bind kwargs to a per sample reader, going through a ParseCache if
+    cache is given.
+    '''
+    if cache is None:
+        return partial(reader, **kwargs)
+
+    if not isinstance(cache, ParseCache):
+        cache = ParseCache(cache)
+
+    return CachedReader(cache, reader, files, **kwargs)
+
+
+def read_quants(pattern='salmon/*_salmon_out', tool='salmon', n_jobs=1,
+                executor='process', sparse=False, cache=None, store=None, profile=None,
+                **kwargs):
     ''' Read quantification results from every directory matching the glob
     in pattern.
 
     Parameters
     ----------
+    pattern, str or readquant.manifest.SampleManifest
+        Glob pattern of the sample directories, or a manifest of them. For
+        Salmon results this can also be a tar archive, optionally followed
+        by a glob pattern of the sample directories in it, e.g.
+        'results.tar.gz' or 'results.tar.gz/salmon/*_salmon_out'. The
+        archive is streamed through once, and the quantification files are
+        parsed from memory while the rest of it is decompressed.
+
     tool, str, default 'salmon'
         The quantification tool used to generate the results. Currently
         supports 'salmon', 'sailfish', 'kallisto', and 'cufflinks'.
 
+    n_jobs, int, default 1
+        Number of samples to parse concurrently. -1 uses all available cores.
+
+    executor, str or concurrent.futures.Executor, default 'process'
+        Whether to parse samples in a 'process' or 'thread' pool when
+        n_jobs is not 1, or an existing Executor to use.
+
+    sparse, bool, default False
+        Whether to collect only the non-zero values of each sample in a
+        sparse matrix, for single-cell scale data. Requires scipy.
+
+    cache, str or readquant.cache.ParseCache, default None
+        Directory of (or an existing) on-disk cache of parsed samples. When
+        given, only samples which are new or have changed since they were
+        cached are parsed again. Not used for archives.
+
+    store, str, default None
+        If given, stream samples to an on-disk store in this directory as
+        they are parsed instead of collecting them in memory. See
+        readquant.store.StoreWriter.
+
+    profile, readquant.profile.Profile, default None
+        Record the time spent finding, reading, parsing and assembling
+        samples in this Profile. By default the Profile of an enclosing
+        'with Profile()' block, if any.
+
     **kwargs,
         kwargs are passed on to the tool specific sample parser. See documentation
         for individual parsers for details.
@@ -120,7 +426,21 @@ def read_quants(pattern='salmon/*_salmon_out', tool='salmon', **kwargs):
     Returns
     -------
     A pandas.DataFrame where columns are samples, rows are genes, and cells
-    contain the expression value.
+    contain the expression value. Columns are in glob order. If samples have
+    different sets of genes, rows are the union of them and values missing
+    in a sample are NaN.
+
+    If sparse is True the DataFrame has pandas sparse columns, with features
+    missing in a sample being zero. The underlying scipy.sparse matrix can be
+    obtained with DataFrame.sparse.to_coo().
+
+    If store is given a readquant.QuantMatrix of the store is returned
+    instead.
+
+    If unit is a list, e.g. unit=['TPM', 'NumReads'] for Salmon, every
+    sample is parsed once for all the units and a dict mapping each unit to
+    its matrix is returned. With store, each unit is written to a
+    subdirectory of store named after it.
     '''
     sample_readers = {
         'salmon': read_salmon,
@@ -129,42 +449,328 @@ def read_quants(pattern='salmon/*_salmon_out', tool='salmon', **kwargs):
         'cufflinks': read_cufflinks
     }
 
-    quant_reader = sample_readers[tool]
+    sample_files = {
+        'salmon': _salmon_files,
+        'sailfish': _salmon_files,
+        'kallisto': _kallisto_files,
+        'cufflinks': _cufflinks_files
+    }
+
+    archive_parsers = {
+        'salmon': (_parse_salmon_members, _salmon_members),
+        'sailfish': (_parse_salmon_members, _salmon_members)
+    }
+
+    profile = profiler(profile)
+    archive, member_pattern = _split_archive(pattern)
+    if archive is not None:
+        if tool not in archive_parsers:
+            raise ValueError('Can not read {} results from an archive'.format(tool))
+
+        cache = None
+        sample_paths = []
+        parse, members = archive_parsers[tool]
+        results = _map_archive_samples(partial(parse, **kwargs), archive, member_pattern,
+                                       members(**kwargs), profile)
+    else:
+        quant_reader = _sample_reader(sample_readers[tool], sample_files[tool], cache, kwargs)
+        profiled_reader = profile.wrap(quant_reader, None if cache is not None else sample_files[tool],
+                                       **kwargs)
+
+        with profile.stage('discovery'):
+            sample_paths = _find_samples(pattern)
+
+        results = profile.unwrap(_map_samples(profiled_reader, sample_paths,
+                                              n_jobs=n_jobs, executor=executor))
 
-    quants = pd.DataFrame()
-    for sample_path in tqdm(iglob(pattern)):
-        sample_quant = quant_reader(sample_path, **kwargs)
+    if sparse and store is not None:
+        raise ValueError('sparse and store can not be combined')
+
+    def assembler(store):
+        if store is not None:
+            return StoreWriter(store)
+        elif sparse:
+            return SparseAssembler(n_samples=len(sample_paths))
+        else:
+            return DenseAssembler(n_samples=len(sample_paths))
+
+    units = kwargs.get('unit')
+    if isinstance(units, (list, tuple)):
+        quants = LayeredAssembler({
+            unit: assembler(None if store is None else os.path.join(store, unit))
+            for unit in units
+        })
+    else:
+        quants = assembler(store)
+
+    for sample_path, sample_quant in results:
         if sample_quant is not None:
-            quants[sample_path] = sample_quant
+            with profile.stage('assemble'):
+                quants.add(sample_path, sample_quant)
+
+    if cache is not None:
+        quant_reader.cache.evict()
+
+    with profile.stage('assemble'):
+        return quants.result()
+
+
+def gp_smoothing_matrix(x, x_new, length_scale=50., alpha=1e-10):
+    ''' Linear map giving the posterior mean at x_new of a zero mean Gaussian
+    process with a fixed RBF kernel, fitted to values observed at x.
 
-    return quants
+    This is what sklearn's GaussianProcessRegressor predicts with a fixed
+    RBF(length_scale) kernel and normalize_y=False, but as a matrix it can be
+    computed once and applied to any number of samples.
 
+    Parameters
+    ----------
+    x, numpy.ndarray
+        Positions of the observed values.
+
+    x_new, numpy.ndarray
+        Positions to predict at.
+
+    length_scale, float, default 50.
+        Length scale of the RBF kernel.
 
-def read_salmon_3p_bias(pattern='salmon/*_salmon_out/'):
+    alpha, float, default 1e-10
+        Value added to the diagonal of the kernel matrix for numerical
+        stability, as in sklearn.
+
+    Returns
+    -------
+    A numpy.ndarray S of shape (len(x_new), len(x)), such that S @ y is the
+    smoothed curve for values y.
+    '''
+    from scipy.linalg import cho_factor, cho_solve
+
+    def rbf(a, b):
+        return np.exp(-0.5 * np.subtract.outer(a, b) ** 2 / length_scale ** 2)
+
+    # The kernel matrix is badly conditioned, so solve with its Cholesky
+    # factor like sklearn does rather than inverting it.
+    K = rbf(x, x) + alpha * np.eye(len(x))
+    return cho_solve(cho_factor(K, lower=True), rbf(x_new, x).T).T
+
+
+def read_salmon_3p_bias(pattern='salmon/*_salmon_out/', length_scale=50., n_out=100, model=2,
+                        n_jobs=1, executor='thread', profile=None):
     ''' Read a smoothed representation of 3p bias for each sample.
+
+    The observed 3' positional bias of one length bin is smoothed by Gaussian
+    process regression with a fixed RBF kernel. Since the kernel is fixed the
+    smoothing is a linear map, which is applied to all samples at once.
+
+    Parameters
+    ----------
+    pattern, str or readquant.manifest.SampleManifest
+        Glob pattern of the sample directories, ending in '/', or a
+        manifest of them.
+
+    length_scale, float, default 50.
+        Length scale of the RBF kernel, in percent of transcript length.
+
+    n_out, int, default 100
+        Number of evenly spaced points from 0 to 100 percent of transcript
+        length to evaluate the smoothed bias at. The input grid is given by
+        the number of position bins in the Salmon model.
+
+    model, int, default 2
+        Which of the transcript length bins to use.
+
+    n_jobs, int, default 1
+        Number of files to read concurrently.
+
+    executor, str, default 'thread'
+        Whether to read files in a 'thread' or 'process' pool.
+
+    profile, readquant.profile.Profile, default None
+        See read_quants.
+
+    Returns
+    -------
+    A pandas.DataFrame where columns are samples and rows are points along
+    transcripts.
     '''
     from .utils import PosModel
-    p = PosModel()
 
-    from sklearn import gaussian_process
-    kernel = gaussian_process.kernels.RBF(50., (50., 50.))
-    gpr = gaussian_process.GaussianProcessRegressor(kernel=kernel, normalize_y=False)
-    
-    xx = np.linspace(0, 100, 20)[:, None]
-    xxx = np.linspace(0, 100, 100)[:, None]
+    profile = profiler(profile)
+    with profile.stage('discovery'):
+        sample_files = _find_sample_files(pattern, 'aux_info/obs3_pos.gz')
 
-    pattern += 'aux_info/obs3_pos.gz'
+    sample_paths = [s for s, _ in sample_files]
+    files = [f for _, f in sample_files]
+    if not files:
+        return pd.DataFrame()
 
-    sample_3p_bias = pd.DataFrame()
-    for f in tqdm(iglob(pattern)):
-        p.from_file(f)
-        yy = pd.DataFrame(p.models).iloc[:, 2]
-        yyy = gpr.fit(xx, yy).predict(xxx)
-        sample_3p_bias[f.replace('aux_info/obs3_pos.gz', '')] = yyy
+    length_bins, models = PosModel.batch(files, n_jobs=n_jobs, executor=executor, profile=profile)
+
+    with profile.stage('assemble'):
+        yy = models[:, model, :]
+
+        xx = np.linspace(0, 100, yy.shape[1])
+        xxx = np.linspace(0, 100, n_out)
+        smoother = gp_smoothing_matrix(xx, xxx, length_scale=length_scale)
+
+        sample_3p_bias = pd.DataFrame(smoother.dot(yy.T), columns=sample_paths)
 
     return sample_3p_bias
 
 
+def read_salmon_pos_bias(pattern='salmon/*_salmon_out/', kinds=('obs5', 'obs3', 'exp5', 'exp3'),
+                         n_jobs=1, executor='thread'):
+    ''' Read the positional bias models of every sample.
+
+    Parameters
+    ----------
+    pattern, str or readquant.manifest.SampleManifest
+        Glob pattern of the sample directories, ending in '/', or a
+        manifest of them.
+
+    kinds, tuple of str, default ('obs5', 'obs3', 'exp5', 'exp3')
+        Which models to read, from files named aux_info/<kind>_pos.gz.
+        Samples are the directories which have the first kind.
+
+    n_jobs, int, default 1
+        Number of files to read concurrently.
+
+    executor, str, default 'thread'
+        Whether to read files in a 'thread' or 'process' pool.
+
+    Returns
+    -------
+    sample_paths, list of str
+        The samples, in the order of the first axis of the models.
+
+    length_bins, numpy.ndarray
+        The upper transcript length of each model.
+
+    models, dict
+        Maps each kind to a 3D array of shape (samples, length bins,
+        position bins).
+    '''
+    from .utils import PosModel
+
+    suffix = 'aux_info/{}_pos.gz'
+    sample_paths = [s for s, _ in _find_sample_files(pattern, suffix.format(kinds[0]))]
+
+    models = {}
+    length_bins = None
+    for kind in kinds:
+        files = [os.path.join(sample_path, suffix.format(kind)) for sample_path in sample_paths]
+        kind_length_bins, models[kind] = PosModel.batch(files, n_jobs=n_jobs, executor=executor)
+        if length_bins is None:
+            length_bins = kind_length_bins
+
+    return sample_paths, length_bins, models
+
+
+# Compiled scanners for the values we need from log files, so each file is
+# searched in a single pass.
+_SALMON_LOG = re.compile(r'Observed (?P<num_processed>\d+) total'
+                         r'|mapping rate = (?P<percent_mapped>[^%\s]+)%')
+_TOPHAT_INPUT = re.compile(r'Input[^\n]*?(\d+)[ \t]*$', re.M)
+_TOPHAT_OVERALL = re.compile(r'^[ \t]*([^%\s]+)%[^\n]*overall', re.M)
+
+_QC_DTYPES = {
+    'num_processed': np.int64,
+    'num_mapped': np.int64,
+    'percent_mapped': np.float64,
+    'global_fl_mode': np.int64,
+    'robust_fl_mode': np.int64,
+    'input_reads': np.int64,
+    'pct_mapped': np.float64
+}
+
+
+def _scan_salmon_log(text):
+    ''' Get the number of fragments and mapping rate from a Salmon 0.4.0
+    salmon_quant.log. The last reported value of each is used.
+    '''
+    qc_data = {}
+    for match in _SALMON_LOG.finditer(text):
+        if match.group('num_processed') is not None:
+            qc_data['num_processed'] = int(match.group('num_processed'))
+        else:
+            qc_data['percent_mapped'] = float(match.group('percent_mapped'))
+
+    return {k: qc_data[k] for k in ('num_processed', 'percent_mapped') if k in qc_data}
+
+
+def _typed_qc_table(QCs):
+    ''' Cast known QC columns to their types, where no values are missing.
+    '''
+    for column, dtype in _QC_DTYPES.items():
+        if column in QCs and not QCs[column].isnull().any():
+            QCs[column] = QCs[column].astype(dtype)
+
+    return QCs
+
+
+def fragment_length_modes(flen_dists, flen_lim=(100, 100), lengths=None):
+    ''' Global and robust modes of many fragment length distributions at
+    once.
+
+    Parameters
+    ----------
+    flen_dists, numpy.ndarray
+        Samples x fragment length array of distributions.
+
+    flen_lim, tuple (int start, int end), default (100, 100)
+        How many bases to remove from start and end of each distribution
+        when calculating the robust mode.
+
+    lengths, numpy.ndarray, default None
+        The length of the distribution of each sample, if they are padded
+        to different lengths. Samples with length 0 get modes 0.
+
+    Returns
+    -------
+    global_fl_mode, robust_fl_mode, numpy.ndarrays with one mode per sample.
+    '''
+    n_samples, n_bins = flen_dists.shape
+    if n_bins == 0:
+        # No sample has a fragment length distribution.
+        return np.zeros(n_samples, dtype=np.int64), np.zeros(n_samples, dtype=np.int64)
+
+    if lengths is None:
+        lengths = np.full(n_samples, n_bins)
+
+    global_fl_mode = flen_dists.argmax(axis=1)
+
+    bins = np.arange(n_bins)
+    robust_bins = (bins >= flen_lim[0]) & (bins < (lengths - flen_lim[1])[:, None])
+    robust_fl_mode = np.where(robust_bins, flen_dists, -np.inf).argmax(axis=1)
+    robust_fl_mode[~robust_bins.any(axis=1)] = 0
+
+    return global_fl_mode, robust_fl_mode
+
+
+def _report_parse_errors(reader, sample_path, *args):
+    ''' Call reader on a sample, naming the sample if it can not be parsed.
+    '''
+    try:
+        return reader(sample_path, *args)
+
+    except ValueError:
+        print('Error parsing {}'.format(sample_path))
+        raise
+
+
+def _salmon_qc_members(version='0.7.2'):
+    meta_files = {
+        '0.7.2': 'aux_info/meta_info.json',
+        '0.6.0': 'aux/meta_info.json',
+        '0.4.0': 'logs/salmon_quant.log'
+    }
+    return ['libParams/flenDist.txt', meta_files[version]]
+
+
+def _salmon_qc_files(sample_path, flen_lim=(100, 100), version='0.7.2'):
+    return [sample_path + '/' + member for member in _salmon_qc_members(version)]
+
+
 def read_salmon_qc(sample_path, flen_lim=(100, 100), version='0.7.2'):
     ''' Parse technical quality control data from a Salmon quantification
     result.
@@ -187,44 +793,157 @@ def read_salmon_qc(sample_path, flen_lim=(100, 100), version='0.7.2'):
     A pandas.Series with technical information from the Salmon results for
     the sample.
     '''
+    record, flen_dist = _read_salmon_qc_record(sample_path, version=version)
+    if flen_dist is None:
+        flen_dist = np.zeros(0)
+
+    global_fl_mode, robust_fl_mode = fragment_length_modes(flen_dist[None, :], flen_lim)
+    record['global_fl_mode'] = global_fl_mode[0]
+    record['robust_fl_mode'] = robust_fl_mode[0]
+
+    return pd.Series(record)
+
+
+def _read_salmon_qc_record(sample_path, version='0.7.2'):
+    ''' Read the QC values and fragment length distribution of a sample.
+
+    Returns
+    -------
+    record, dict
+        QC values by name.
+
+    flen_dist, numpy.ndarray
+        The fragment length distribution, or None if it is missing.
+    '''
+    flen_file, meta_file = _salmon_qc_files(sample_path, version=version)
     try:
-        flen_dist = np.fromfile(sample_path + '/libParams/flenDist.txt', sep='\t')
-        global_fl_mode = flen_dist.argmax()
-        robust_fl_mode = flen_dist[flen_lim[0]:-flen_lim[1]].argmax() + flen_lim[0]
+        flen_dist = np.fromfile(flen_file, sep='\t')
     except FileNotFoundError:
-        global_fl_mode = 0
-        robust_fl_mode = 0
+        flen_dist = None
+
+    with open(meta_file) as fh:
+        record = _salmon_qc_values(fh.read(), version)
+
+    return record, flen_dist
+
 
-    if version == '0.7.2':
-        qc_data = pd.read_json(sample_path + '/aux_info/meta_info.json', typ='series')
-        qc_data = qc_data[['num_processed', 'num_mapped', 'percent_mapped']]
-        qc_data['global_fl_mode'] = global_fl_mode
-        qc_data['robust_fl_mode'] = robust_fl_mode
+def _parse_salmon_qc_members(sample_path, files, version='0.7.2'):
+    ''' Parse the QC values and fragment length distribution of a sample from
+    the contents of its files, as read by
+    readquant.archive.iter_archive_samples. See _read_salmon_qc_record.
+    '''
+    flen_member, meta_member = _salmon_qc_members(version)
+    if meta_member not in files:
+        raise FileNotFoundError('Could not find {}/{}'.format(sample_path, meta_member))
+
+    flen_dist = None
+    if flen_member in files:
+        flen_dist = np.array(files[flen_member].split(), dtype=np.float64)
 
-    if version == '0.6.0':
-        qc_data = pd.read_json(sample_path + '/aux/meta_info.json', typ='series')
-        qc_data = qc_data[['num_processed', 'num_mapped', 'percent_mapped']]
-        qc_data['global_fl_mode'] = global_fl_mode
-        qc_data['robust_fl_mode'] = robust_fl_mode
+    return _salmon_qc_values(files[meta_member].decode('utf-8'), version), flen_dist
 
+
+def _salmon_qc_values(meta_text, version='0.7.2'):
+    ''' QC values from the text of a meta_info.json, or of the
+    salmon_quant.log of Salmon 0.4.0.
+    '''
     if version == '0.4.0':
-        qc_data = pd.Series()
-        log_file = sample_path + '/logs/salmon_quant.log'
-        with open(log_file) as fh:
-            for l in fh:
-                if 'Observed ' in l:
-                    frags = int(l.split('Observed ')[-1].split(' total')[0])
-                    qc_data['num_processed'] = frags
+        return _scan_salmon_log(meta_text)
 
-                if 'mapping rate' in l:
-                    rate = float(l.split(' = ')[1].split('%')[0])
-                    qc_data['percent_mapped'] = rate
+    meta = json.loads(meta_text)
+    return {k: meta[k] for k in ('num_processed', 'num_mapped', 'percent_mapped')}
 
 
-        qc_data['global_fl_mode'] = global_fl_mode
-        qc_data['robust_fl_mode'] = robust_fl_mode
+def read_salmon_qcs(pattern='salmon/*_salmon_out', flen_lim=(100, 100), version='0.7.2',
+                    n_jobs=1, executor='thread', return_fld=False, profile=None):
+    ''' Read technical quality control data of many Salmon results at once.
 
-    return qc_data
+    The small per sample files are read concurrently, and fragment length
+    modes are computed for all samples with one vectorised argmax.
+
+    Parameters
+    ----------
+    pattern, str or readquant.manifest.SampleManifest
+        Glob pattern of the sample directories, or a manifest of them. Can
+        also be a tar archive of results, see read_quants.
+
+    flen_lim, tuple (int start, int end), default (100, 100)
+        See read_salmon_qc.
+
+    version, str, default '0.7.2'
+        See read_salmon_qc.
+
+    n_jobs, int, default 1
+        Number of samples to read concurrently. -1 uses all available cores.
+
+    executor, str or concurrent.futures.Executor, default 'thread'
+        Whether to read samples in a 'thread' or 'process' pool.
+
+    return_fld, bool, default False
+        Whether to also return all fragment length distributions.
+
+    profile, readquant.profile.Profile, default None
+        See read_quants.
+
+    Returns
+    -------
+    A pandas.DataFrame where rows are samples and columns are technical
+    features, with integer columns for counts and modes.
+
+    If return_fld is True, also a samples x fragment length numpy.ndarray
+    of the fragment length distributions, padded with zeros.
+    '''
+    profile = profiler(profile)
+    archive, member_pattern = _split_archive(pattern)
+    if archive is not None:
+        parse = partial(_report_parse_errors, partial(_parse_salmon_qc_members, version=version))
+        results = _map_archive_samples(parse, archive, member_pattern, _salmon_qc_members(version),
+                                       profile)
+    else:
+        with profile.stage('discovery'):
+            all_sample_paths = _find_samples(pattern)
+
+        record_reader = profile.wrap(partial(_report_parse_errors,
+                                             partial(_read_salmon_qc_record, version=version)),
+                                     _salmon_qc_files, version=version)
+        results = profile.unwrap(_map_samples(record_reader, all_sample_paths,
+                                              n_jobs=n_jobs, executor=executor))
+
+    sample_paths = []
+    records = []
+    flen_dists = []
+    for sample_path, (record, flen_dist) in results:
+        sample_paths.append(sample_path)
+        records.append(record)
+        flen_dists.append(np.zeros(0) if flen_dist is None else flen_dist)
+
+    with profile.stage('assemble'):
+        QCs, fld = _salmon_qc_table(sample_paths, records, flen_dists, flen_lim)
+
+    if return_fld:
+        return QCs, fld
+
+    return QCs
+
+
+def _salmon_qc_table(sample_paths, records, flen_dists, flen_lim):
+    ''' Combine the QC records and fragment length distributions of samples
+    into a table.
+    '''
+    lengths = np.array([len(f) for f in flen_dists], dtype=np.int64)
+    fld = np.zeros((len(flen_dists), lengths.max() if len(lengths) else 0))
+    for i, flen_dist in enumerate(flen_dists):
+        fld[i, :len(flen_dist)] = flen_dist
+
+    QCs = pd.DataFrame.from_records(records, index=sample_paths)
+    QCs['global_fl_mode'], QCs['robust_fl_mode'] = fragment_length_modes(fld, flen_lim, lengths)
+    QCs = _typed_qc_table(QCs)
+
+    return QCs, fld
+
+
+def _tophat_qc_files(sample_path):
+    return [sample_path + '/align_summary.txt']
 
 
 def read_tophat_qc(sample_path):
@@ -241,31 +960,46 @@ def read_tophat_qc(sample_path):
     for the sample.
     '''
     with open(sample_path + '/align_summary.txt') as fh:
-        for l in fh:
-            if 'Input' in l:
-                n_reads = int(l.split()[-1])
-                break
+        text = fh.read()
 
-        for l in fh:
-            if 'overall' in l:
-                pct_mapped = float(l.split('%')[0])
-                break
+    n_input = _TOPHAT_INPUT.search(text)
+    overall = _TOPHAT_OVERALL.search(text, n_input.end())
 
-    qc_data = pd.Series({'input_reads': n_reads,
-                         'pct_mapped': pct_mapped})
+    qc_data = pd.Series({'input_reads': int(n_input.group(1)),
+                         'pct_mapped': float(overall.group(1))})
 
     return qc_data
 
 
-def read_qcs(pattern='salmon/*_salmon_out', tool='salmon', **kwargs):
+def read_qcs(pattern='salmon/*_salmon_out', tool='salmon', n_jobs=1, executor='thread',
+             cache=None, profile=None, **kwargs):
     ''' Read technical quality control data results from every directory
     matching the glob in pattern.
 
     Parameters
     ----------
+    pattern, str or readquant.manifest.SampleManifest
+        Glob pattern of the sample directories, or a manifest of them. Can
+        also be a tar archive of Salmon results, see read_quants.
+
     tool, str, default 'salmon'
         The quantification tool used to generate the results. Currently
-        supports 'salmon' and 'sailfish'.
+        supports 'salmon', 'sailfish' and 'tophat'.
+
+    n_jobs, int, default 1
+        Number of samples to read concurrently. -1 uses all available cores.
+
+    executor, str or concurrent.futures.Executor, default 'thread'
+        Whether to read samples in a 'thread' or 'process' pool.
+
+    cache, str or readquant.cache.ParseCache, default None
+        Directory of (or an existing) on-disk cache of parsed samples. When
+        given, only samples which are new or have changed since they were
+        cached are parsed again. Otherwise, and for archives, Salmon results
+        are read with read_salmon_qcs.
+
+    profile, readquant.profile.Profile, default None
+        See read_quants.
 
     **kwargs,
         kwargs are passed on to the tool specific sample parser. See documentation
@@ -282,17 +1016,35 @@ def read_qcs(pattern='salmon/*_salmon_out', tool='salmon', **kwargs):
         'tophat': read_tophat_qc
     }
 
-    qc_reader = sample_readers[tool]
+    sample_files = {
+        'salmon': _salmon_qc_files,
+        'sailfish': _salmon_qc_files,
+        'tophat': _tophat_qc_files
+    }
+
+    archive, _ = _split_archive(pattern)
+    if archive is not None and sample_readers[tool] is not read_salmon_qc:
+        raise ValueError('Can not read {} results from an archive'.format(tool))
 
-    QCs = pd.DataFrame()
-    for sample_path in tqdm(iglob(pattern)):
-        try:
-            sample_qc = qc_reader(sample_path, **kwargs)
+    if sample_readers[tool] is read_salmon_qc and (cache is None or archive is not None):
+        return read_salmon_qcs(pattern, n_jobs=n_jobs, executor=executor, profile=profile,
+                               **kwargs)
 
-        except ValueError:
-            print('Error parsing {}'.format(sample_path))
-            raise
+    profile = profiler(profile)
+    qc_reader = _sample_reader(sample_readers[tool], sample_files[tool], cache, kwargs)
+    profiled_reader = profile.wrap(partial(_report_parse_errors, qc_reader),
+                                   None if cache is not None else sample_files[tool], **kwargs)
 
+    with profile.stage('discovery'):
+        sample_paths = _find_samples(pattern)
+
+    QCs = {}
+    for sample_path, sample_qc in profile.unwrap(_map_samples(profiled_reader, sample_paths,
+                                                              n_jobs=n_jobs, executor=executor)):
         QCs[sample_path] = sample_qc
 
-    return QCs.T
+    if cache is not None:
+        qc_reader.cache.evict()
+
+    with profile.stage('assemble'):
+        return _typed_qc_table(pd.DataFrame.from_dict(QCs, orient='index'))
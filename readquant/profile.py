@@ -0,0 +1,289 @@
+from __future__ import print_function
+
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+STAGES = ('discovery', 'read', 'parse', 'assemble')
+
+# Profiles entered as context managers, innermost last.
+_active = []
+
+
+def _read_files(files, chunk_size=1024 ** 2):
+    ''' Read files from disk without keeping their contents, returning the
+    number of bytes read. Used by the cold read probe of Profile.
+    '''
+    n_bytes = 0
+    for path in files:
+        try:
+            with open(path, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(chunk_size), b''):
+                    n_bytes += len(chunk)
+
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    return n_bytes
+
+
+def _file_sizes(files):
+    ''' Total size of files from their metadata, without reading them.
+    '''
+    n_bytes = 0
+    for path in files:
+        try:
+            n_bytes += os.stat(path).st_size
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    return n_bytes
+
+
+class ProfiledReader(object):
+    ''' Wraps a per sample reader so it also returns the time spent reading
+    and parsing the sample, and optionally the bytes read and the peak
+    memory used.
+
+    Parsing happens where the reader runs, possibly in another process, so
+    the measurements are returned with the result rather than recorded.
+
+    Parameters
+    ----------
+    reader, callable
+        Per sample parser taking a sample path, with other arguments bound.
+
+    files, callable, default None
+        Function taking the sample path and kwargs and returning the list of
+        files reader parses for the sample, whose sizes are reported as the
+        bytes read. If None, no bytes are reported.
+
+    read_probe, bool, default False
+        Read the files once before the reader runs as a cold read probe,
+        timed as the 'read' stage, after which the reader parses them from
+        the page cache. This reads every file twice. Otherwise the reader's
+        own reading is part of the 'parse' stage.
+
+    trace_memory, bool, default False
+        Measure the peak memory of the reader with tracemalloc, which slows
+        it down. Tracing is stopped again after the call if it was started
+        for it, e.g. in a pool worker.
+
+    **kwargs,
+        Arguments passed on to files.
+
+    '''
+    def __init__(self, reader, files=None, read_probe=False, trace_memory=False, **kwargs):
+        self.reader = reader
+        self.files = files
+        self.read_probe = read_probe
+        self.trace_memory = trace_memory
+        self.kwargs = kwargs
+
+    def __call__(self, sample_path):
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+
+        record = {'read': 0., 'bytes': 0, 'peak_memory': float('nan')}
+        try:
+            if self.files is not None and self.read_probe:
+                start = time.time()
+                record['bytes'] = _read_files(self.files(sample_path, **self.kwargs))
+                record['read'] = time.time() - start
+
+            elif self.files is not None:
+                record['bytes'] = _file_sizes(self.files(sample_path, **self.kwargs))
+
+            start = time.time()
+            result = self.reader(sample_path)
+            record['parse'] = time.time() - start
+            if self.trace_memory:
+                record['peak_memory'] = tracemalloc.get_traced_memory()[1] - base_memory
+
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        return result, record
+
+
+class Profile(object):
+    ''' Collects the time spent in each stage of reading many samples.
+
+    The stages are 'discovery' (finding samples), 'read' (reading files from
+    disk), 'parse' (parsing them) and 'assemble' (combining samples into
+    the result). Read and parse times and the bytes of the files read are
+    also kept for every sample, and with trace_memory the peak memory.
+
+    By default readers are timed as they are, reading their own files, so
+    'parse' includes the time spent reading, and the bytes, taken from the
+    file sizes, are counted for it. Streaming from archives is the
+    exception, where waiting for the decompressing thread is 'read'.
+
+    Pass a Profile as the profile argument of read_quants, read_qcs or
+    read_salmon_3p_bias, or use it as a context manager to profile every
+    call made inside the block:
+
+        with Profile() as profile:
+            quants = read_quants('salmon/*_salmon_out')
+
+        print(profile.report())
+
+    Read and parse times of samples parsed in parallel add up to more than
+    the wall time.
+
+    Parameters
+    ----------
+    callback, callable, default None
+        Called with the sample path and a dict of its measurements as each
+        sample finishes, e.g. to log progress.
+
+    read_probe, bool, default False
+        Read the files of every sample once before parsing it, timed as
+        'read' with the bytes read, to separate disk or network time from
+        parsing. This doubles the I/O, and parsing is then timed on a warm
+        page cache.
+
+    trace_memory, bool, default False
+        Measure the peak memory of parsing each sample with tracemalloc,
+        which slows parsing down. In thread pools samples parsed at the same
+        time share the peak.
+
+    '''
+    def __init__(self, callback=None, read_probe=False, trace_memory=False):
+        self.callback = callback
+        self.read_probe = read_probe
+        self.trace_memory = trace_memory
+        self.stages = {stage: {'seconds': 0., 'bytes': 0, 'calls': 0} for stage in STAGES}
+        self.samples = {}
+        self._started_tracing = False
+
+    def __enter__(self):
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active.remove(self)
+
+    @contextmanager
+    def stage(self, name):
+        ''' Context manager adding the wall time of its block to a stage.
+        '''
+        start = time.time()
+        try:
+            yield
+
+        finally:
+            self._add(name, time.time() - start)
+
+    def _add(self, name, seconds, n_bytes=0):
+        stage = self.stages.setdefault(name, {'seconds': 0., 'bytes': 0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['bytes'] += n_bytes
+        stage['calls'] += 1
+
+    def wrap(self, reader, files=None, **kwargs):
+        ''' Wrap a per sample reader in a ProfiledReader.
+        '''
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        return ProfiledReader(reader, files, read_probe=self.read_probe,
+                              trace_memory=self.trace_memory, **kwargs)
+
+    def unwrap(self, results):
+        ''' Record the measurements of (sample_path, (result, record)) pairs
+        from a wrapped reader, yielding (sample_path, result).
+        '''
+        try:
+            for sample_path, (result, record) in results:
+                # Without the probe the bytes are read while parsing.
+                self._add('read', record['read'], record['bytes'] if self.read_probe else 0)
+                self._add('parse', record['parse'], 0 if self.read_probe else record['bytes'])
+                self.samples[sample_path] = record
+                if self.callback is not None:
+                    self.callback(sample_path, record)
+
+                yield sample_path, result
+
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def summary(self):
+        ''' The totals of every stage.
+
+        Returns
+        -------
+        A pandas.DataFrame indexed by stage, with the total 'seconds',
+        'bytes' read, number of 'calls', and 'MB/s' for stages which read.
+        '''
+        summary = pd.DataFrame.from_dict(self.stages, orient='index')[['seconds', 'bytes', 'calls']]
+        summary.index.name = 'stage'
+        summary['MB/s'] = summary['bytes'] / 1024 ** 2 / summary['seconds'].where(summary['bytes'] > 0)
+
+        return summary
+
+    def slowest(self, n=10):
+        ''' The n samples which took longest to read and parse.
+
+        Returns
+        -------
+        A pandas.DataFrame indexed by sample, with 'read' and 'parse'
+        seconds, 'bytes' read and 'peak_memory' in bytes. Peak memory is
+        NaN unless trace_memory is used.
+        '''
+        samples = pd.DataFrame.from_dict(self.samples, orient='index',
+                                         columns=['read', 'parse', 'bytes', 'peak_memory'])
+        total = samples['read'] + samples['parse']
+
+        return samples.loc[total.sort_values(ascending=False).index[:n]]
+
+    def report(self, n=10):
+        ''' A printable summary table and the n slowest samples.
+        '''
+        slowest = self.slowest(n)
+        slowest['peak_memory'] = slowest['peak_memory'] / 1024 ** 2
+        slowest = slowest.rename(columns={'peak_memory': 'peak MB'})
+
+        return '{}\n\nSlowest samples:\n{}'.format(
+            self.summary().to_string(float_format='{:.3f}'.format),
+            slowest.to_string(float_format='{:.3f}'.format))
+
+
+class _NoProfile(object):
+    ''' Stand in for Profile when nothing is profiled.
+    '''
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def wrap(self, reader, files=None, **kwargs):
+        return reader
+
+    def unwrap(self, results):
+        return results
+
+
+def profiler(profile=None):
+    ''' The Profile to record to: profile if given, otherwise the innermost
+    Profile used as a context manager, or one which records nothing.
+    '''
+    if profile is not None:
+        return profile
+
+    if _active:
+        return _active[-1]
+
+    return _NoProfile()
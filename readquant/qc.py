@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+from .data import ERCC
+
+
+def _as_matrix(quants):
+    ''' The values of a genes x samples DataFrame, as a scipy.sparse.csc_matrix
+    for sparse frames and a numpy.ndarray otherwise.
+    '''
+    try:
+        return quants.sparse.to_coo().tocsc()
+    except AttributeError:
+        return np.asarray(quants.values, dtype=np.float64)
+
+
+def _positions(index, labels):
+    ''' Positions in index of the labels which are present in it.
+    '''
+    positions = index.get_indexer(pd.Index(labels).unique())
+    return positions[positions >= 0]
+
+
+def _row_sums(values, positions):
+    ''' Per sample sums of the rows at positions.
+    '''
+    if len(positions) == 0:
+        return np.zeros(values.shape[1])
+
+    rows = values[positions]
+    if not isinstance(rows, np.ndarray):
+        return np.asarray(rows.sum(axis=0)).ravel()
+
+    return np.nansum(rows, axis=0)
+
+
+def _column_sums(values):
+    if not isinstance(values, np.ndarray):
+        return np.asarray(values.sum(axis=0)).ravel()
+
+    return np.nansum(values, axis=0)
+
+
+def _count_above(values, thresholds, block_size=256):
+    ''' Per sample count of values above a per sample threshold.
+    '''
+    if not isinstance(values, np.ndarray):
+        col_thresholds = np.repeat(thresholds, np.diff(values.indptr))
+        above = np.concatenate([[0], np.cumsum(values.data > col_thresholds)])
+        return above[values.indptr[1:]] - above[values.indptr[:-1]]
+
+    # Work on blocks of samples to bound the size of the temporary mask.
+    counts = np.empty(values.shape[1], dtype=np.int64)
+    for start in range(0, values.shape[1], block_size):
+        end = start + block_size
+        counts[start:end] = (values[:, start:end] > thresholds[start:end]).sum(axis=0)
+
+    return counts
+
+
+def detection_limits(log_concentration, detected, min_detected=8, tol=1e-10, max_iter=100):
+    ''' Estimate the detection limit of every sample from the spike-ins which
+    were detected in it.
+
+    For each sample a logistic regression of detection on log concentration
+    is fitted, and the detection limit is the concentration where the
+    probability of detection is 0.5. The fits use the same objective as
+    sklearn's LogisticRegression(solver='liblinear'), an L2 penalty with
+    C = 1 on both the coefficient and the intercept, and are solved for all
+    samples together with Newton's method on the 2 x 2 systems.
+
+    Parameters
+    ----------
+    log_concentration, numpy.ndarray
+        Log concentration of each spike-in.
+
+    detected, numpy.ndarray
+        Boolean spike-ins x samples array of whether each spike-in was
+        detected in each sample.
+
+    min_detected, int, default 8
+        Samples with fewer detected spike-ins get an infinite limit.
+
+    Returns
+    -------
+    A numpy.ndarray with the detection limit of each sample.
+    '''
+    from scipy.special import expit
+
+    x = np.asarray(log_concentration, dtype=np.float64)[:, None]
+    y = np.asarray(detected, dtype=np.float64)
+    coef = np.zeros(y.shape[1])
+    intercept = np.zeros(y.shape[1])
+
+    for _ in range(max_iter):
+        p = expit(x * coef + intercept)
+        residual = p - y
+        weight = p * (1 - p)
+
+        g_coef = (x * residual).sum(axis=0) + coef
+        g_intercept = residual.sum(axis=0) + intercept
+        h_cc = (x ** 2 * weight).sum(axis=0) + 1
+        h_ci = (x * weight).sum(axis=0)
+        h_ii = weight.sum(axis=0) + 1
+        det = h_cc * h_ii - h_ci ** 2
+
+        step_coef = (h_ii * g_coef - h_ci * g_intercept) / det
+        step_intercept = (h_cc * g_intercept - h_ci * g_coef) / det
+        coef -= step_coef
+        intercept -= step_intercept
+
+        if max(np.abs(step_coef).max(initial=0), np.abs(step_intercept).max(initial=0)) < tol:
+            break
+
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        limits = np.exp(-intercept / coef)
+
+    limits[y.sum(axis=0) < min_detected] = np.inf
+
+    return limits
+
+
+def ercc_accuracy(log_concentration, ercc_quants, det_threshold=0.1, min_detected=8):
+    ''' Pearson correlation between log expression and log concentration of
+    spike-ins for every sample. Spike-ins which are not expressed in a sample
+    are left out of its correlation.
+
+    Parameters
+    ----------
+    log_concentration, numpy.ndarray
+        Log concentration of each spike-in.
+
+    ercc_quants, numpy.ndarray
+        Spike-ins x samples array of expression values.
+
+    det_threshold, float, default 0.1
+        Expression level for counting a spike-in as detected.
+
+    min_detected, int, default 8
+        Samples with fewer detected spike-ins get accuracy -inf.
+
+    Returns
+    -------
+    A numpy.ndarray with the accuracy of each sample.
+    '''
+    x = np.asarray(log_concentration, dtype=np.float64)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(ercc_quants)
+
+    finite = np.isfinite(y)
+    n = finite.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = np.where(finite, x - np.where(finite, x, 0).sum(axis=0) / n, 0)
+        dy = np.where(finite, y - np.where(finite, y, 0).sum(axis=0) / n, 0)
+        accuracy = (dx * dy).sum(axis=0) / np.sqrt((dx ** 2).sum(axis=0) * (dy ** 2).sum(axis=0))
+
+    n_detected = (np.where(finite, y, -np.inf) >= np.log(det_threshold)).sum(axis=0)
+    accuracy[n_detected < min_detected] = -np.inf
+
+    return accuracy
+
+
+def bio_qc(quants, ercc_concentration=None, mt_genes=(), rrna_genes=(), det_threshold=0.1):
+    ''' Calculate biological quality control measures for every sample of an
+    expression matrix at once.
+
+    The rows of the spike-ins, mitochondrial and rRNA genes are looked up
+    once, and all measures are computed with vectorised operations on the
+    whole matrix.
+
+    Parameters
+    ----------
+    quants, pandas.DataFrame
+        TPM matrix where columns are samples and rows are genes, e.g. from
+        read_quants. May be sparse.
+
+    ercc_concentration, pandas.Series, default None
+        Concentrations of spike-ins indexed by ID. Defaults to ERCC Mix 1.
+
+    mt_genes, list-like, default ()
+        IDs of mitochondrial genes.
+
+    rrna_genes, list-like, default ()
+        IDs of rRNA genes.
+
+    det_threshold, float, default 0.1
+        Expression level for counting a spike-in as detected.
+
+    Returns
+    -------
+    A pandas.DataFrame where rows are samples, with columns
+    'detection_limit', 'accuracy', 'ERCC_content', 'num_genes', 'MT_content'
+    and 'rRNA_content'. Gene counts and contents are computed after removing
+    spike-ins and renormalising to one million.
+    '''
+    if ercc_concentration is None:
+        ercc_concentration = ERCC()['concentration in Mix 1 (attomoles/ul)']
+
+    values = _as_matrix(quants)
+    ercc_pos = _positions(quants.index, ercc_concentration.index)
+    log_concentration = np.log(ercc_concentration[quants.index[ercc_pos]].values)
+
+    ercc_quants = values[ercc_pos]
+    if not isinstance(ercc_quants, np.ndarray):
+        ercc_quants = ercc_quants.toarray()
+
+    QCs = pd.DataFrame(index=quants.columns)
+    QCs['detection_limit'] = detection_limits(log_concentration, ercc_quants >= det_threshold)
+    QCs['accuracy'] = ercc_accuracy(log_concentration, ercc_quants, det_threshold)
+
+    ercc_content = np.nansum(ercc_quants, axis=0)
+    QCs['ERCC_content'] = ercc_content
+
+    # Spike-ins are removed and the rest renormalised to one million.
+    scale = np.ones(values.shape[1])
+    if len(ercc_pos) > 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = 1e6 / (_column_sums(values) - ercc_content)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thresholds = 1. / scale
+
+    QCs['num_genes'] = _count_above(values, thresholds) - (ercc_quants > thresholds).sum(axis=0)
+    QCs['MT_content'] = _row_sums(values, _positions(quants.index, mt_genes)) * scale
+    QCs['rRNA_content'] = _row_sums(values, _positions(quants.index, rrna_genes)) * scale
+
+    return QCs
@@ -0,0 +1,418 @@
+from __future__ import print_function
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+STORE_FORMAT = 'readquant-store'
+STORE_VERSION = 1
+
+
+def _write_json(path, obj):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(obj, fh)
+
+    os.replace(tmp_path, path)
+
+
+def read_store_meta(path):
+    ''' Read the metadata of a quantification store.
+
+    Parameters
+    ----------
+    path, str
+        The store directory.
+
+    Returns
+    -------
+    A dict with 'dtype', 'n_rows', 'n_columns' and 'index_name'.
+    '''
+    with open(os.path.join(path, 'meta.json')) as fh:
+        meta = json.load(fh)
+
+    if meta.get('format') != STORE_FORMAT:
+        raise ValueError('Not a readquant store: {}'.format(path))
+
+    return meta
+
+
+def _read_labels(path, n):
+    with open(path) as fh:
+        labels = fh.read().split('\n')
+
+    return labels[:n]
+
+
+def _positions(labels, key):
+    ''' Convert a label based key to positions along one axis, as a slice
+    when possible so the selection is a view.
+    '''
+    if isinstance(key, slice):
+        if key == slice(None):
+            return key
+
+        return labels.slice_indexer(key.start, key.stop, key.step)
+
+    if np.ndim(key) == 0:
+        return labels.get_loc(key)
+
+    key = np.asarray(key)
+    if key.dtype == bool:
+        positions = np.flatnonzero(key)
+    else:
+        positions = labels.get_indexer(key)
+
+    if (positions < 0).any():
+        missing = [k for k, p in zip(key, positions) if p < 0]
+        raise KeyError('Not in store: {}'.format(missing[:10]))
+
+    # Runs of consecutive labels are returned as slices, keeping them views.
+    if len(positions) > 0 and (np.diff(positions) == 1).all():
+        return slice(positions[0], positions[-1] + 1)
+
+    return positions
+
+
+class _LocIndexer(object):
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+
+        rows, columns = key
+        m = self.matrix
+        row_pos = _positions(m.index, rows)
+        col_pos = _positions(m.columns, columns)
+
+        row_scalar = isinstance(row_pos, (int, np.integer))
+        col_scalar = isinstance(col_pos, (int, np.integer))
+        if row_scalar and col_scalar:
+            return m.values[row_pos, col_pos]
+
+        if isinstance(row_pos, np.ndarray) and isinstance(col_pos, np.ndarray):
+            values = m.values[np.ix_(row_pos, col_pos)]
+        else:
+            values = m.values[row_pos, col_pos]
+
+        if row_scalar:
+            return pd.Series(values, index=m.columns[col_pos], name=m.index[row_pos])
+
+        if col_scalar:
+            return pd.Series(values, index=m.index[row_pos], name=m.columns[col_pos])
+
+        return QuantMatrix(values, index=m.index[row_pos], columns=m.columns[col_pos])
+
+
+class QuantMatrix(object):
+    ''' A genes x samples expression matrix backed by a memory mapped
+    quantification store (see StoreWriter for the layout).
+
+    Opening a store only reads its metadata and maps the values, so it takes
+    the same time regardless of the size of the matrix. Labels are read when
+    first needed, and values are only read from disk when accessed.
+    Selections with .loc of slices or consecutive labels are views of the
+    memory map, other selections copy only the selected values.
+
+    Example
+
+    >>> qm = QuantMatrix.open('expression_store')
+    >>> panel = qm.loc[['ENSG00000111640', 'ENSG00000075624'], :].to_pandas()
+
+    '''
+    def __init__(self, values, index=None, columns=None, path=None, meta=None):
+        self.values = values
+        self.path = path
+        self._index = index
+        self._columns = columns
+        self._meta = meta
+
+    @classmethod
+    def open(cls, path):
+        ''' Open a quantification store.
+
+        Parameters
+        ----------
+        path, str
+            The store directory.
+
+        Returns
+        -------
+        A QuantMatrix.
+        '''
+        meta = read_store_meta(path)
+        shape = (meta['n_rows'], meta['n_columns'])
+        if shape[0] * shape[1] == 0:
+            values = np.empty(shape, dtype=meta['dtype'], order='F')
+        else:
+            values = np.memmap(os.path.join(path, 'values.bin'), dtype=meta['dtype'],
+                               mode='r', shape=shape, order='F')
+
+        return cls(values, path=path, meta=meta)
+
+    @classmethod
+    def from_frame(cls, quants, path, chunk_size=64):
+        ''' Write a DataFrame to a new quantification store.
+
+        Parameters
+        ----------
+        quants, pandas.DataFrame
+            Matrix where columns are samples and rows are genes.
+
+        path, str
+            The store directory.
+
+        Returns
+        -------
+        A QuantMatrix of the new store.
+        '''
+        writer = StoreWriter(path, chunk_size=chunk_size)
+        for sample in quants.columns:
+            writer.add(sample, quants[sample])
+
+        return writer.result()
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = pd.Index(_read_labels(os.path.join(self.path, 'rows.txt'),
+                                                self._meta['n_rows']),
+                                   name=self._meta['index_name'])
+
+        return self._index
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = pd.Index(_read_labels(os.path.join(self.path, 'columns.txt'),
+                                                  self._meta['n_columns']))
+
+        return self._columns
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def loc(self):
+        ''' Label based selection of genes and samples, like
+        pandas.DataFrame.loc. Returns a QuantMatrix, or a pandas.Series when
+        a single gene or sample is selected.
+        '''
+        return _LocIndexer(self)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return '<QuantMatrix {} genes x {} samples{}>'.format(
+            self.shape[0], self.shape[1], '' if self.path is None else ' at ' + self.path)
+
+    def to_pandas(self):
+        ''' The matrix as a pandas.DataFrame sharing memory with the store.
+
+        Returns
+        -------
+        A pandas.DataFrame where columns are samples and rows are genes.
+        '''
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
+
+    def append(self, quants, chunk_size=64):
+        ''' Append samples to the store on disk.
+
+        Parameters
+        ----------
+        quants, pandas.DataFrame or pandas.Series
+            Samples to add, indexed by gene. A Series is added as one sample
+            named by its name. Genes are aligned to the store like in
+            StoreWriter.
+
+        '''
+        if self.path is None:
+            raise ValueError('Can only append to a QuantMatrix opened from a store')
+
+        if isinstance(quants, pd.Series):
+            quants = quants.to_frame()
+
+        writer = StoreWriter(self.path, chunk_size=chunk_size, mode='a')
+        for sample in quants.columns:
+            writer.add(sample, quants[sample])
+
+        writer.flush()
+        reopened = QuantMatrix.open(self.path)
+        self.values = reopened.values
+        self._meta = reopened._meta
+        self._columns = None
+
+
+def load_store(path):
+    ''' Load a quantification store as a DataFrame backed by a memory map,
+    so values are only read from disk when they are accessed.
+
+    Parameters
+    ----------
+    path, str
+        The store directory.
+
+    Returns
+    -------
+    A pandas.DataFrame where columns are samples and rows are genes.
+    '''
+    return QuantMatrix.open(path).to_pandas()
+
+
+class StoreWriter(object):
+    ''' Helper class for streaming per sample expression vectors to an
+    on-disk quantification store.
+
+    A store is a directory with the gene labels in 'rows.txt', sample labels
+    in 'columns.txt', and the values as a raw column major array in
+    'values.bin', described by 'meta.json'. Samples are buffered in chunks of
+    chunk_size columns and appended to the end of 'values.bin', so memory use
+    does not depend on the number of samples.
+
+    The genes of the store are taken from the first sample. Later samples are
+    aligned to them, with NaN for missing genes, and genes which are not in
+    the first sample are dropped with a warning.
+    '''
+    def __init__(self, path, chunk_size=64, dtype='float64', n_samples=0, mode='w'):
+        '''
+
+        Parameters
+        ----------
+        path, str
+            The store directory. Created if it does not exist, and any
+            existing store in it is overwritten.
+
+        chunk_size, int, default 64
+            Number of samples to buffer before writing them out.
+
+        dtype, str, default 'float64'
+            Data type of the stored values.
+
+        n_samples, int, default 0
+            Ignored, for compatibility with the in memory assemblers.
+
+        mode, str, default 'w'
+            'w' to create a new store, 'a' to append samples to an existing
+            store, in which case dtype is taken from the store.
+
+        '''
+        self.path = path
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self.index = None
+        self.columns = []
+        self._buffer = None
+        self._buffered = 0
+        self._n_written = 0
+
+        if mode == 'a':
+            existing = QuantMatrix.open(path)
+            self.dtype = existing.values.dtype
+            self.columns = list(existing.columns)
+            self._n_written = len(self.columns)
+            # The genes of an empty store are those of the first sample added.
+            if self._n_written > 0:
+                self.index = existing.index
+                self._buffer = np.empty((len(self.index), chunk_size), dtype=self.dtype, order='F')
+
+            return
+
+        os.makedirs(path, exist_ok=True)
+        for fn in ('values.bin', 'columns.txt', 'rows.txt', 'meta.json'):
+            if os.path.exists(os.path.join(path, fn)):
+                os.remove(os.path.join(path, fn))
+
+    def _write_meta(self):
+        _write_json(os.path.join(self.path, 'meta.json'), {
+            'format': STORE_FORMAT,
+            'version': STORE_VERSION,
+            'dtype': self.dtype.str,
+            'n_rows': len(self.index),
+            'n_columns': self._n_written,
+            'index_name': self.index.name
+        })
+
+    def add(self, name, quant):
+        ''' Add the expression vector of a sample.
+
+        Parameters
+        ----------
+        name, str
+            The name of the sample, becomes the column label.
+
+        quant, pandas.Series
+            Expression values of the sample, indexed by gene.
+
+        '''
+        if self.index is None:
+            self.index = quant.index
+            self._buffer = np.empty((len(self.index), self.chunk_size),
+                                    dtype=self.dtype, order='F')
+            with open(os.path.join(self.path, 'rows.txt'), 'w') as fh:
+                fh.write('\n'.join(self.index.astype(str)))
+
+        if quant.index is self.index or quant.index.equals(self.index):
+            self._buffer[:, self._buffered] = quant.values
+
+        else:
+            codes = self.index.get_indexer(quant.index)
+            if (codes < 0).any():
+                print('WARNING: Dropping {} genes of {} which are not in the store'
+                      .format((codes < 0).sum(), name))
+
+            column = self._buffer[:, self._buffered]
+            column[:] = np.nan
+            column[codes[codes >= 0]] = quant.values[codes >= 0]
+
+        self.columns.append(name)
+        self._buffered += 1
+        if self._buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        ''' Write buffered samples to disk.
+        '''
+        if self._buffered == 0:
+            return
+
+        # The transpose of a Fortran ordered chunk is C contiguous, so it is
+        # written as is without a copy.
+        with open(os.path.join(self.path, 'values.bin'), 'ab') as fh:
+            self._buffer[:, :self._buffered].T.tofile(fh)
+
+        new_columns = self.columns[self._n_written:]
+        with open(os.path.join(self.path, 'columns.txt'), 'a') as fh:
+            if self._n_written > 0:
+                fh.write('\n')
+
+            fh.write('\n'.join(str(c) for c in new_columns))
+
+        self._n_written += self._buffered
+        self._buffered = 0
+        self._write_meta()
+
+    def result(self):
+        ''' Flush remaining samples and open the store.
+
+        Returns
+        -------
+        A QuantMatrix of the store, with no rows or columns if no samples
+        were added.
+        '''
+        if self.index is None:
+            self.index = pd.Index([])
+            for fn in ('rows.txt', 'columns.txt'):
+                open(os.path.join(self.path, fn), 'w').close()
+
+            self._write_meta()
+
+        self.flush()
+
+        return QuantMatrix.open(self.path)
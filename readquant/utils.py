@@ -1,53 +1,197 @@
 from __future__ import print_function
 
-import sys
-import struct
+import io
 import gzip
+import threading
 
 
+import numpy as np
 import pandas as pd
-import click
-from xml.etree.ElementTree import Element, SubElement, tostring
-import requests
-import six
-import pycurl
-from urllib.parse import urlencode
+from xml.etree.ElementTree import Element, SubElement, tostring, fromstring
 from urllib.parse import quote_plus
-from io import BytesIO
+
+
+def parse_pos_model(buf):
+    ''' Parse the binary positional bias models written by Salmon.
+
+    The buffer is read through np.frombuffer views at increasing offsets, so
+    nothing but the final array is copied.
+
+    Parameters
+    ----------
+    buf, bytes
+        Decompressed contents of e.g. aux_info/obs3_pos.gz.
+
+    Returns
+    -------
+    length_bins, numpy.ndarray
+        The upper transcript length of each model.
+
+    models, numpy.ndarray
+        2D array with one row per model and one column per position bin.
+        If models have different numbers of bins, rows are padded with NaN.
+    '''
+    uint = np.dtype('I')
+    double = np.dtype('d')
+
+    num_models = int(np.frombuffer(buf, dtype=uint, count=1)[0])
+    offset = uint.itemsize
+
+    length_bins = np.frombuffer(buf, dtype=uint, count=num_models, offset=offset)
+    offset += num_models * uint.itemsize
+
+    rows = []
+    for i in range(num_models):
+        model_bins = int(np.frombuffer(buf, dtype=uint, count=1, offset=offset)[0])
+        offset += uint.itemsize
+        rows.append(np.frombuffer(buf, dtype=double, count=model_bins, offset=offset))
+        offset += model_bins * double.itemsize
+
+    num_bins = max([len(r) for r in rows] + [0])
+    models = np.full((num_models, num_bins), np.nan)
+    for i, row in enumerate(rows):
+        models[i, :len(row)] = row
+
+    return length_bins.astype(np.int64), models
+
+
+def _pos_model_files(fn):
+    return [fn]
 
 
 class PosModel:
     ''' Helper class for parsing positional bias parameters from Salmon.
+
+    After from_file(), length_bins holds the upper transcript length of each
+    model, values is a models x position bins array, and models is a dict
+    from length bin to the corresponding row of values.
     '''
     def __init__(self):
         self.models = {}
+        self.length_bins = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((0, 0))
 
     def from_file(self, fn):
-        f = gzip.open(fn)
-        b = f.read()
+        with gzip.open(fn) as f:
+            b = f.read()
+
+        self.length_bins, self.values = parse_pos_model(b)
+        self.models = dict(zip(self.length_bins.tolist(), self.values))
+
+    @staticmethod
+    def read_values(fn):
+        ''' Read the models in a file as (length_bins, values) without
+        making a PosModel, see parse_pos_model.
+        '''
+        with gzip.open(fn) as f:
+            return parse_pos_model(f.read())
+
+    @staticmethod
+    def batch(files, n_jobs=1, executor='thread', profile=None):
+        ''' Read the models of many files into one array.
+
+        Parameters
+        ----------
+        files, list of str
+            Positional bias files, e.g. 'aux_info/obs3_pos.gz' of every
+            sample.
+
+        n_jobs, int, default 1
+            Number of files to read concurrently.
+
+        executor, str, default 'thread'
+            Whether to read files in a 'thread' or 'process' pool.
+
+        profile, readquant.profile.Profile, default None
+            Record the time spent reading files and assembling the array.
+
+        Returns
+        -------
+        length_bins, numpy.ndarray
+            The length bins of the models of the first file.
+
+        models, numpy.ndarray
+            3D array of shape (files, models, position bins). Files with
+            fewer models or bins are padded with NaN.
+        '''
+        from .parse import _map_samples
+        from .profile import profiler
+
+        profile = profiler(profile)
+        reader = profile.wrap(PosModel.read_values, _pos_model_files)
+        parsed = [r for _, r in profile.unwrap(_map_samples(reader, files,
+                                                            n_jobs=n_jobs, executor=executor))]
+        if not parsed:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 0, 0))
+
+        with profile.stage('assemble'):
+            num_models = max(values.shape[0] for _, values in parsed)
+            num_bins = max(values.shape[1] for _, values in parsed)
+            models = np.full((len(parsed), num_models, num_bins), np.nan)
+            for i, (_, values) in enumerate(parsed):
+                models[i, :values.shape[0], :values.shape[1]] = values
+
+        return parsed[0][0], models
+
+
+# Connections are kept per thread and reused between queries, so several
+# queries to the same server share one connection.
+_connections = threading.local()
+
+
+def _requests_session():
+    import requests
+
+    if getattr(_connections, 'session', None) is None:
+        _connections.session = requests.Session()
+
+    return _connections.session
+
+
+def _curl_handles():
+    import pycurl
 
-        offset = 0
-        uint_size = struct.calcsize('I')
-        double_size = struct.calcsize('d')
+    if getattr(_connections, 'curl', None) is None:
+        _connections.curl = (pycurl.Curl(), pycurl.CurlMulti())
 
-        num_models = struct.unpack_from('I', b[offset:])[0]
-        offset += uint_size
+    return _connections.curl
 
-        length_bins = []
-        for i in range(0, num_models):
-            length_bins.append(struct.unpack_from('I', b[offset:])[0])
-            offset += uint_size
 
-        models = []
-        for i in range(0, num_models):
-            model_bins = struct.unpack_from('I', b[offset:])[0]
-            offset += uint_size
-            model = list(struct.unpack_from('d'*model_bins, b[offset:]))
-            offset += model_bins * double_size
-            models.append(model)
-        f.close()
-        self.models = dict(zip(length_bins, models))
+def _restart(restart, status):
+    ''' Handle a response to a range request which starts from byte 0.
 
+    Skipping the bytes already downloaded would splice together two
+    responses, which are not guaranteed to be identical.
+    '''
+    if restart is None:
+        raise IOError('BioMart server ignored the range request ({}), '
+                      'the response starts from byte 0'.format(status))
+
+    restart()
+
+
+class _ChunkStream(io.RawIOBase):
+    ''' Read only file object over an iterator of bytes chunks.
+    '''
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b''
+                return 0
+
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+
+        return n
 
 
 class BioMartQuery(object):
@@ -65,11 +209,16 @@ class BioMartQuery(object):
     >>> q.add_attributes("ensembl_gene_id")
     >>> df = q.stream()
 
+    Large results can be processed in batches as they arrive
+
+    >>> for batch in q.iter_batches(batch_size=10000):
+    ...     print(len(batch))
+
     """
 
     biomart_base = 'http://www.ensembl.org/biomart/martservice?query='
 
-    def __init__(self, dataset, method='pycurl'):
+    def __init__(self, dataset, method='pycurl', base_url=None, cache=None):
         """
 
         Parameters
@@ -78,8 +227,23 @@ class BioMartQuery(object):
             The BioMart organism dataset to query. E.g. 'hsapiens_gene_ensembl'
         method, str, default 'pycurl'
             Python library to use for the request.
+        base_url, str, default None
+            URL the encoded query is appended to, to use another BioMart
+            server or mirror. Defaults to biomart_base.
+        cache, str or readquant.cache.QueryCache, default None
+            Directory of (or an existing) cache of query results, which
+            stream() takes results from when possible.
 
         """
+        if base_url is not None:
+            self.biomart_base = base_url
+
+        if isinstance(cache, str):
+            from .cache import QueryCache
+            cache = QueryCache(cache)
+
+        self.cache = cache
+
         self._query = Element('Query', attrib={
             'virtualSchemaName': 'default',
             'formatter': 'TSV',
@@ -93,10 +257,27 @@ class BioMartQuery(object):
             'interface': 'default'
         })
         self.headings = []
-        if method == 'pycurl':
-            self.getter = self._pycurl_piecewise
-        else:
-            self.getter = self._requests_piecewise
+        self.method = method
+
+    @classmethod
+    def from_xml(cls, xml, method='pycurl', base_url=None, cache=None):
+        """ Make a query from BioMart query XML, e.g. from
+        readquant.data.reference_templates()
+
+        Parameters
+        ----------
+        xml, str
+            The query XML.
+
+        Other parameters are as for BioMartQuery.
+
+        """
+        query = cls('', method=method, base_url=base_url, cache=cache)
+        query._query = fromstring(xml.encode('utf-8'))
+        query._dataset_query = query._query.find('Dataset')
+        query.headings = [a.get('name') for a in query._dataset_query.iter('Attribute')]
+
+        return query
 
     def add_attributes(self, *attributes):
         """
@@ -122,43 +303,143 @@ class BioMartQuery(object):
 
         """
 
-        for key, value in six.iteritems(filters):
+        for key, value in filters.items():
             self._dataset_query.append(Element(
                 'Filter', attrib={'name': key, 'value': value}))
 
-    def _requests_piecewise(self, handle):
+    def _requests_chunks(self, chunk_size, start=0, restart=None):
+        request_url = self.biomart_base + self.encoded_request()
+        headers = {'Range': 'bytes={}-'.format(start)} if start else {}
+        with _requests_session().get(request_url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if start and response.status_code != 206:
+                _restart(restart, response.status_code)
+
+            for chunk in response.iter_content(chunk_size):
+                yield chunk
+
+    def _pycurl_chunks(self, chunk_size, start=0, restart=None):
+        import pycurl
 
         request_url = self.biomart_base + self.encoded_request()
-        print("Making request to biomart...")
-        response = requests.get(self.biomart_base + str(self), stream=True)
-        if not response.ok:
-            print("Request failed: %d" % response.status_code)
-            return
-        print("Response okay. Downloading...")
-        total_length = response.headers.get('content-length')
-        total_downloaded = 0
-        if total_length is None:
-            for block in response.iter_content(1024):
-                handle.write(block)
-                total_downloaded += 1024
-                # stdscr.addstr('%d MB Downloaded' %
-                #                  (total_downloaded / 1e6))
-                # stdscr.refresh()
+        curl, multi = _curl_handles()
+        received = []
+        curl.setopt(pycurl.URL, request_url)
+        curl.setopt(pycurl.WRITEFUNCTION, received.append)
+        curl.setopt(pycurl.BUFFERSIZE, chunk_size)
+        if start:
+            curl.setopt(pycurl.RANGE, '{}-'.format(start))
         else:
-            with click.progressbar(length=int(total_length),
-                                   label="Downloading reference") as bar:
-                for block in response.iter_content(1024):
-                    handle.write(block)
-                    bar.update(1024)
+            curl.unsetopt(pycurl.RANGE)
 
-    def _pycurl_piecewise(self, handle):
+        multi.add_handle(curl)
+        try:
+            checked = False
+            failed = []
+            running = True
+            while running:
+                ret, running = multi.perform()
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, running = multi.perform()
 
-        request_url = self.biomart_base + self.encoded_request()
-        c = pycurl.Curl()
-        c.setopt(c.URL, request_url)
-        c.setopt(c.WRITEDATA, handle)
-        c.perform()
-        c.close()
+                if not running:
+                    _, _, failed = multi.info_read()
+
+                # The status is known once the body starts arriving, which is
+                # checked before passing any of it on.
+                if (received or not (running or failed)) and not checked:
+                    status = curl.getinfo(pycurl.RESPONSE_CODE)
+                    if status >= 400:
+                        raise IOError('BioMart request failed: {}'.format(status))
+
+                    if start and status != 206:
+                        _restart(restart, status)
+
+                    checked = True
+
+                # What arrived before a failure is passed on first, so a
+                # download can resume after it.
+                while received:
+                    yield received.pop(0)
+
+                if failed:
+                    raise pycurl.error(*failed[0][1:])
+
+                if running:
+                    multi.select(1.0)
+
+        finally:
+            multi.remove_handle(curl)
+
+    def iter_content(self, chunk_size=64 * 1024, start=0, restart=None):
+        """ Iterate over the raw response as it arrives
+
+        The connection is reused by later queries made in the same thread.
+
+        Parameters
+        ----------
+        chunk_size, int, default 64 KiB
+            Size of chunks to read.
+        start, int, default 0
+            Byte offset in the response to start from, to resume a partial
+            download with a range request.
+        restart, callable, default None
+            Called without arguments before the first chunk if the server
+            ignored the range request and sends the whole response, which
+            then starts from byte 0, e.g. to truncate the partial download.
+            If None, such a response raises IOError.
+
+        Returns
+        -------
+        An iterator of bytes chunks of the response.
+
+        """
+        if self.method == 'pycurl':
+            return self._pycurl_chunks(chunk_size, start, restart)
+
+        return self._requests_chunks(chunk_size, start, restart)
+
+    def _read_csv(self, **kwargs):
+        try:
+            return pd.read_csv(io.BufferedReader(_ChunkStream(self.iter_content())),
+                               sep='\t', encoding='utf-8', header=None,
+                               names=self.headings, **kwargs)
+
+        except pd.errors.EmptyDataError:
+            return None
+
+    def iter_batches(self, batch_size=100000):
+        """ Iterate over the result as DataFrames, parsed as the response
+        arrives, so only one batch is kept in memory at a time.
+
+        Parameters
+        ----------
+        batch_size, int, default 100000
+            Number of rows in each DataFrame.
+
+        Returns
+        -------
+        An iterator of pd.DataFrames of returned values with headers
+
+        """
+        if self.cache is not None:
+            df = self.cache.get(self)
+            if df is not None:
+                for start in range(0, len(df), batch_size):
+                    yield df.iloc[start:start + batch_size]
+
+                return
+
+            if self.cache.offline:
+                raise KeyError('Query not in the BioMart cache in offline mode: {}'.format(self))
+
+        batches = self._read_csv(chunksize=batch_size)
+        if batches is None:
+            return
+
+        with batches:
+            for batch in batches:
+                yield batch
 
     def download(self, outfile):
         """ Download request to file
@@ -171,11 +452,17 @@ class BioMartQuery(object):
         """
 
         with open(outfile, 'wb') as outbuffer:
-            self.getter(outbuffer)
+            for chunk in self.iter_content():
+                outbuffer.write(chunk)
 
     def stream(self):
         """ Stream request to pandas DataFrame
 
+        The response is parsed as it arrives, with the same chunked reader as
+        iter_batches, so it is never buffered as a whole. When the query has
+        a cache, results are taken from it if present, and stored in it
+        after they are fetched.
+
         Returns
         -------
         df, pd.DataFrame
@@ -183,12 +470,20 @@ class BioMartQuery(object):
 
         """
 
-        outbuffer = BytesIO()
-        self.getter(outbuffer)
-        outbuffer.seek(0)
+        if self.cache is not None:
+            df = self.cache.get(self)
+            if df is not None:
+                return df
+
+            if self.cache.offline:
+                raise KeyError('Query not in the BioMart cache in offline mode: {}'.format(self))
+
+        df = self._read_csv()
+        if df is None:
+            df = pd.DataFrame(columns=self.headings)
 
-        df = pd.read_csv(outbuffer, sep='\t', encoding='utf-8')
-        df.set_axis(1, self.headings)
+        if self.cache is not None:
+            self.cache.put(self, df)
 
         return df
 
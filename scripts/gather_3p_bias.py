@@ -0,0 +1,5 @@
+from readquant.cli import three_prime_bias
+
+
+if __name__ == '__main__':
+    three_prime_bias()
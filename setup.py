@@ -11,8 +11,11 @@ setup(
         description='Convenience package for parsing RNA-seq quantification results',
         long_description=readme(),
         packages=find_packages(),
-        install_requires=['pandas', 'tqdm'],
+        install_requires=['pandas', 'tqdm', 'click'],
         scripts=glob('scripts/*.py'),
+        entry_points={
+            'console_scripts': ['readquant = readquant.cli:main']
+        },
         author='Valentine Svensson',
         author_email='valentine@nxn.se',
         license='MIT'
@@ -0,0 +1,67 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+
+class _BioMartHandler(BaseHTTPRequestHandler):
+    ''' Serves the body of the server to every query, honouring range
+    requests if the server supports them, and failing as told by the
+    server's failures, one per request: 'error' answers 503 and 'drop'
+    closes the connection half way through the body. Bodies queued in the
+    server's results replace the body, one per request.
+    '''
+    def do_GET(self):
+        server = self.server
+        byte_range = self.headers.get('Range')
+        server.requests.append(byte_range)
+        failure = server.failures.pop(0) if server.failures else None
+        if server.results:
+            server.body = server.results.pop(0)
+
+        if failure == 'error':
+            self.send_error(503)
+            return
+
+        start = 0
+        if byte_range is not None and server.ranges:
+            start = int(byte_range[len('bytes='):].rstrip('-'))
+
+        body = server.body[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(server.body) - 1, len(server.body)))
+
+        self.end_headers()
+        if failure == 'drop':
+            body = body[:len(body) // 2]
+
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def biomart_server():
+    ''' A local stand-in for a BioMart server. Set body, results, ranges
+    and failures on it, and read the Range header of every request made from requests.
+    Pass url as the base_url of queries.
+    '''
+    server = HTTPServer(('127.0.0.1', 0), _BioMartHandler)
+    server.body = b''.join(b'ENSG%011d\tgene%d\n' % (i, i) for i in range(50000))
+    server.ranges = True
+    server.failures = []
+    server.results = []
+    server.requests = []
+    server.url = 'http://127.0.0.1:{}/biomart/martservice?query='.format(server.server_port)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from readquant import download
+from readquant.utils import BioMartQuery
+
+
+METHODS = ['requests', 'pycurl']
+
+
+def _query(server, method):
+    query = BioMartQuery('hsapiens_gene_ensembl', method=method, base_url=server.url)
+    query.add_attributes('ensembl_gene_id', 'external_gene_name')
+
+    return query
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    waits = []
+    monkeypatch.setattr(download.time, 'sleep', waits.append)
+
+    return waits
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_resumes_with_range_request(biomart_server, tmp_path, waits, method):
+    biomart_server.failures = ['drop']
+    path = str(tmp_path / 'genemap.tsv')
+
+    size = download.download_query(_query(biomart_server, method), path, retries=2, backoff=0.)
+
+    with open(path, 'rb') as fh:
+        assert fh.read() == biomart_server.body
+
+    assert size == len(biomart_server.body)
+    assert not os.path.exists(path + '.part')
+    first, resumed = biomart_server.requests
+    assert first is None
+    assert 0 < int(resumed[len('bytes='):].rstrip('-')) < len(biomart_server.body)
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_restarts_when_range_is_ignored(biomart_server, tmp_path, waits, method):
+    biomart_server.ranges = False
+    biomart_server.failures = ['drop']
+    # The result changed between the attempts, so it can not be spliced.
+    biomart_server.results = [biomart_server.body, biomart_server.body.replace(b'gene', b'GENE')]
+    path = str(tmp_path / 'genemap.tsv')
+
+    download.download_query(_query(biomart_server, method), path, retries=2, backoff=0.)
+
+    with open(path, 'rb') as fh:
+        assert fh.read() == biomart_server.body
+
+    assert biomart_server.requests[1] is not None
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_range_ignored_without_restart_raises(biomart_server, method):
+    biomart_server.ranges = False
+
+    with pytest.raises(IOError):
+        list(_query(biomart_server, method).iter_content(start=10))
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_retries_with_backoff(biomart_server, tmp_path, waits, method):
+    biomart_server.failures = ['error', 'error']
+    path = str(tmp_path / 'genemap.tsv')
+
+    download.download_query(_query(biomart_server, method), path, retries=2, backoff=0.5)
+
+    with open(path, 'rb') as fh:
+        assert fh.read() == biomart_server.body
+
+    assert waits == [0.5, 1.]
+    assert len(biomart_server.requests) == 3
+
+
+def test_gives_up_after_retries(biomart_server, tmp_path, waits):
+    biomart_server.failures = ['error'] * 3
+    path = str(tmp_path / 'genemap.tsv')
+
+    with pytest.raises(IOError):
+        download.download_query(_query(biomart_server, 'requests'), path, retries=2, backoff=1.)
+
+    assert waits == [1., 2.]
+    assert not os.path.exists(path)
+
+
+def test_fetch_reference_skips_complete_files(biomart_server, tmp_path):
+    directory = str(tmp_path)
+    manifest = download.fetch_reference(directory=directory, n_jobs=1, method='requests',
+                                        base_url=biomart_server.url)
+
+    assert sorted(manifest) == sorted(download.reference_queries())
+    assert len(biomart_server.requests) == 3
+    for file_name, entry in manifest.items():
+        assert entry['size'] == len(biomart_server.body)
+        assert download.is_complete(directory, file_name, download.reference_queries()[file_name],
+                                    download.read_manifest(directory))
+
+    download.fetch_reference(directory=directory, n_jobs=1, method='requests',
+                             base_url=biomart_server.url)
+    assert len(biomart_server.requests) == 3
+
+    # Only a file which no longer matches the manifest is downloaded again.
+    with open(os.path.join(directory, 'genemap.tsv'), 'ab') as fh:
+        fh.write(b'extra\n')
+
+    download.fetch_reference(directory=directory, n_jobs=1, method='requests',
+                             base_url=biomart_server.url)
+    assert len(biomart_server.requests) == 4
+    with open(os.path.join(directory, 'genemap.tsv'), 'rb') as fh:
+        assert fh.read() == biomart_server.body
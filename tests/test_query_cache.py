@@ -0,0 +1,70 @@
+import time
+
+import pytest
+import pandas as pd
+
+from readquant import cache as cache_module
+from readquant.cache import QueryCache
+from readquant.utils import BioMartQuery
+
+
+def _query(server, cache):
+    query = BioMartQuery('hsapiens_gene_ensembl', method='requests', base_url=server.url,
+                         cache=cache)
+    query.add_attributes('ensembl_gene_id', 'external_gene_name')
+
+    return query
+
+
+def test_results_are_cached(biomart_server, tmp_path):
+    cache = QueryCache(str(tmp_path))
+
+    fetched = _query(biomart_server, cache).stream()
+    cached = _query(biomart_server, cache).stream()
+
+    assert len(biomart_server.requests) == 1
+    assert len(fetched) == 50000
+    pd.testing.assert_frame_equal(fetched, cached)
+
+
+def test_expired_entries_are_fetched_again(biomart_server, tmp_path, monkeypatch):
+    cache = QueryCache(str(tmp_path), ttl=60)
+    _query(biomart_server, cache).stream()
+
+    now = time.time()
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now + 30)
+    assert cache.get(_query(biomart_server, cache)) is not None
+
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now + 120)
+    assert cache.get(_query(biomart_server, cache)) is None
+
+    biomart_server.body = b'ENSG00000000001\tnew\n'
+    refreshed = _query(biomart_server, cache).stream()
+    assert len(biomart_server.requests) == 2
+    assert list(refreshed['external_gene_name']) == ['new']
+
+
+def test_offline_replays_expired_entries(biomart_server, tmp_path, monkeypatch):
+    fetched = _query(biomart_server, QueryCache(str(tmp_path), ttl=60)).stream()
+
+    now = time.time()
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now + 120)
+    offline = QueryCache(str(tmp_path), ttl=60, offline=True)
+    replayed = _query(biomart_server, offline).stream()
+
+    assert len(biomart_server.requests) == 1
+    pd.testing.assert_frame_equal(fetched, replayed)
+
+
+def test_offline_without_entry_raises(biomart_server, tmp_path):
+    offline = QueryCache(str(tmp_path), offline=True)
+    query = _query(biomart_server, offline)
+    query.add_filters(chromosome_name='MT')
+
+    with pytest.raises(KeyError):
+        query.stream()
+
+    with pytest.raises(KeyError):
+        list(query.iter_batches())
+
+    assert biomart_server.requests == []
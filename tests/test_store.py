@@ -0,0 +1,27 @@
+import pandas as pd
+
+from readquant.store import QuantMatrix, StoreWriter
+
+
+def test_empty_store_is_a_quant_matrix(tmp_path):
+    path = str(tmp_path / 'store')
+
+    empty = StoreWriter(path).result()
+
+    assert isinstance(empty, QuantMatrix)
+    assert empty.shape == (0, 0)
+    assert empty.to_pandas().empty
+    assert QuantMatrix.open(path).shape == (0, 0)
+
+
+def test_samples_can_be_added_to_an_empty_store(tmp_path):
+    path = str(tmp_path / 'store')
+    StoreWriter(path).result()
+
+    writer = StoreWriter(path, mode='a')
+    writer.add('S1', pd.Series([1., 2.], index=['a', 'b']))
+    quants = writer.result().to_pandas()
+
+    assert list(quants.columns) == ['S1']
+    assert list(quants.index) == ['a', 'b']
+    assert list(quants['S1']) == [1., 2.]